@@ -0,0 +1,111 @@
+"""
+Wine Deal Hunter — HTML 解析后端对比
+用仓库自带的样例页面（fixtures/pages）加上已抓取的真实页面（page_cache 目录）
+校验各解析后端提取结果一致，并测量耗时；结果不一致时以非零状态退出
+用法: python bench_parser.py [页面文件 ...] [--rounds N] [--check]
+  --check  只做一致性校验，不测耗时
+"""
+import os
+import sys
+import glob
+import time
+import gzip
+
+import scraper
+from html_parser import available_backends
+from page_cache import PAGE_CACHE_DIR, _decompress
+
+# 覆盖各种页面结构：offer 卡片、按国家过滤的表格页、仅 JSON-LD、纯文本价格兜底
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "pages")
+
+
+def _parse(html: str, backend: str) -> tuple:
+    # 固定从默认选择器顺序开始，避免命中学习影响对比结果；命中的选择器和尝试次数一并比较
+    return scraper._parse_offers(html, scraper.OFFER_SELECTORS, backend)
+
+
+def _load_pages(paths: list) -> list:
+    pages = []
+    for path in paths:
+        with open(path, "rb") as f:
+            raw = f.read()
+        if path.endswith(".zst"):
+            raw = _decompress(raw, "zst")
+        elif path.endswith(".gz"):
+            raw = gzip.decompress(raw)
+        pages.append((os.path.basename(path), raw.decode("utf-8", errors="replace")))
+    return pages
+
+
+def default_paths() -> list:
+    """样例页面 + 页面缓存中的真实页面"""
+    return (sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+            + sorted(glob.glob(os.path.join(PAGE_CACHE_DIR, "*.html.*"))))
+
+
+def check_parity(pages: list, backends: list) -> int:
+    """各后端提取结果与 BeautifulSoup 逐页比较，返回不一致的 (页面, 后端) 数"""
+    mismatches = 0
+    for name, html in pages:
+        baseline = _parse(html, "bs4")
+        if not baseline[0]:
+            print(f"⚠️ 页面未提取到任何报价: {name}")
+        for backend in backends:
+            if backend == "bs4":
+                continue
+            result = _parse(html, backend)
+            if result != baseline:
+                mismatches += 1
+                print(f"❌ 结果不一致: {name} ({backend})")
+                print(f"   bs4:        {baseline}")
+                print(f"   {backend + ':':<12}{result}")
+    if not mismatches:
+        print("✅ 所有后端提取结果一致")
+    return mismatches
+
+
+def run(paths: list, rounds: int = 20, check_only: bool = False) -> int:
+    """返回结果不一致数"""
+    pages = _load_pages(paths)
+    if not pages:
+        print(f"没有可用页面（默认读取 {FIXTURE_DIR} 和 {PAGE_CACHE_DIR}），请手动指定 HTML 文件")
+        return 0
+
+    backends = available_backends()
+    print(f"页面 {len(pages)} 个, 每个后端重复 {rounds} 轮, 可用后端: {', '.join(backends)}\n")
+
+    # 1. 结果一致性（以 BeautifulSoup 为基准）
+    mismatches = check_parity(pages, backends)
+    if check_only:
+        return mismatches
+
+    # 2. 耗时
+    timings = {}
+    for backend in backends:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for _, html in pages:
+                _parse(html, backend)
+        timings[backend] = (time.perf_counter() - start) / (rounds * len(pages)) * 1000
+
+    base = timings.get("bs4")
+    print(f"\n{'后端':<12}{'单页耗时(ms)':>14}{'加速比':>10}")
+    for backend, ms in timings.items():
+        speedup = f"{base / ms:.1f}x" if base else "—"
+        print(f"{backend:<12}{ms:>14.2f}{speedup:>10}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    rounds = 20
+    check_only = "--check" in args
+    if check_only:
+        args.remove("--check")
+    if "--rounds" in args:
+        i = args.index("--rounds")
+        rounds = int(args[i + 1])
+        del args[i:i + 2]
+    if not args:
+        args = default_paths()
+    sys.exit(1 if run(args, rounds, check_only) else 0)
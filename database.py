@@ -2,30 +2,54 @@
 数据库模块 — SQLite（轻量免配置）
 管理酒款、捡漏机会、扫描日志
 """
-import aiosqlite
 import os
 import json
+import time
 import logging
 from datetime import datetime
 
+import db_pool
+
 logger = logging.getLogger(__name__)
 
 # 优先从环境变量读取 DB_PATH，方便本地调试和 Zeabur 持久化挂载
 DB_PATH = os.getenv("DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "wine_deals.db"))
 logger.info(f"DB_PATH: {DB_PATH}")
 
+# 同一款酒最多被领取几次（worker 反复在这款酒上崩溃时不再重试）
+SCAN_MAX_ATTEMPTS = int(os.getenv("SCAN_MAX_ATTEMPTS", "3"))
+
 
 async def get_db():
-    """获取数据库连接"""
-    db = await aiosqlite.connect(DB_PATH)
-    db.row_factory = aiosqlite.Row
-    return db
+    """临时打开一个独立连接（调用方负责关闭）；常规读写请用 reader() / writer()"""
+    return await db_pool.connect(DB_PATH)
+
+
+def reader():
+    """只读连接（async with）；应用运行时复用连接池，不会被扫描写入阻塞"""
+    return db_pool.read(DB_PATH)
+
+
+def writer():
+    """写连接（async with）；同一进程内的写入串行执行，需自行 commit"""
+    return db_pool.write(DB_PATH)
+
+
+async def init_db_pool():
+    await db_pool.init_pool(DB_PATH)
+
+
+async def close_db_pool():
+    await db_pool.close_pool()
+
+
+def get_db_pool_stats() -> dict:
+    return db_pool.get_pool_stats()
 
 
 async def init_db():
     """初始化数据库表"""
-    db = await get_db()
-    try:
+    async with writer() as db:
         await db.executescript("""
             CREATE TABLE IF NOT EXISTS opportunities (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -54,6 +78,8 @@ async def init_db():
                 wines_scanned INTEGER DEFAULT 0,
                 opportunities_found INTEGER DEFAULT 0,
                 errors TEXT,
+                timed_out TEXT,
+                deferred TEXT,
                 started_at TIMESTAMP,
                 finished_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 duration_seconds REAL
@@ -69,9 +95,23 @@ async def init_db():
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
 
+            CREATE TABLE IF NOT EXISTS wines (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+                region TEXT,
+                category TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS wine_aliases (
+                alias TEXT PRIMARY KEY COLLATE NOCASE,
+                wine_id INTEGER NOT NULL REFERENCES wines(id)
+            );
+
             CREATE TABLE IF NOT EXISTS price_history (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 wine_name TEXT NOT NULL,
+                wine_id INTEGER REFERENCES wines(id),
                 vintage TEXT,
                 price REAL NOT NULL,
                 currency TEXT DEFAULT 'USD',
@@ -81,71 +121,286 @@ async def init_db():
                 recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
 
+            CREATE TABLE IF NOT EXISTS scan_cache (
+                wine_name TEXT PRIMARY KEY,
+                scanned_at TIMESTAMP NOT NULL,
+                had_opportunity INTEGER DEFAULT 0,
+                miss_streak INTEGER DEFAULT 0,
+                scans INTEGER DEFAULT 0,
+                opportunity_hits INTEGER DEFAULT 0,
+                last_profit_rate REAL
+            );
+
+            CREATE TABLE IF NOT EXISTS scan_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scan_type TEXT,
+                status TEXT DEFAULT 'running',
+                profit_threshold REAL,
+                notify INTEGER DEFAULT 1,
+                concurrency INTEGER,
+                skipped INTEGER DEFAULT 0,
+                deferred TEXT,
+                cancel_requested INTEGER DEFAULT 0,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS scan_job_items (
+                job_id INTEGER NOT NULL,
+                wine_name TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                region TEXT,
+                category TEXT,
+                status TEXT DEFAULT 'pending',
+                opportunity INTEGER DEFAULT 0,
+                error TEXT,
+                lease_owner TEXT,
+                lease_expires_at REAL,
+                attempts INTEGER DEFAULT 0,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (job_id, wine_name)
+            );
+
+            CREATE TABLE IF NOT EXISTS price_stats (
+                wine_name TEXT PRIMARY KEY,
+                last_price REAL,
+                last_at TIMESTAMP,
+                drift REAL DEFAULT 0,
+                variance REAL DEFAULT 0,
+                samples INTEGER DEFAULT 0
+            );
+
+            -- 优先级调度的请求预算令牌桶（单行，所有进程共用）
+            CREATE TABLE IF NOT EXISTS request_budget (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+
             CREATE INDEX IF NOT EXISTS idx_opp_profit ON opportunities(profit_rate DESC);
             CREATE INDEX IF NOT EXISTS idx_opp_status ON opportunities(status);
             CREATE INDEX IF NOT EXISTS idx_opp_created ON opportunities(created_at DESC);
-            CREATE INDEX IF NOT EXISTS idx_price_wine ON price_history(wine_name);
+            CREATE INDEX IF NOT EXISTS idx_opp_active_profit ON opportunities(profit_rate) WHERE status = 'active';
         """)
+        await db.executescript(_STATS_SCHEMA)
+        await _migrate(db)
         await db.commit()
-    finally:
-        await db.close()
+
+
+# 首页统计（/api/stats）：单行物化表，由触发器随机会与扫描日志的写入在同一事务内增量维护
+# today_* 按 UTC 日期分桶，读取时日期已过期即视为 0；最高利润率仅在移除当前最大值时
+# 通过部分索引 idx_opp_active_profit 重新取最大值（O(log n)）
+_STATS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_opportunities INTEGER DEFAULT 0,
+        today_date TEXT,
+        today_opportunities INTEGER DEFAULT 0,
+        max_profit_rate REAL,
+        total_scans INTEGER DEFAULT 0,
+        last_scan TIMESTAMP
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_stats_opp_insert AFTER INSERT ON opportunities
+    WHEN NEW.status = 'active'
+    BEGIN
+        UPDATE stats SET
+            total_opportunities = total_opportunities + 1,
+            today_opportunities = CASE WHEN today_date = date('now') THEN today_opportunities ELSE 0 END
+                + IFNULL(date(NEW.created_at) = date('now'), 0),
+            today_date = date('now'),
+            max_profit_rate = CASE WHEN max_profit_rate IS NULL OR NEW.profit_rate > max_profit_rate
+                THEN NEW.profit_rate ELSE max_profit_rate END
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stats_opp_delete AFTER DELETE ON opportunities
+    WHEN OLD.status = 'active'
+    BEGIN
+        UPDATE stats SET
+            total_opportunities = total_opportunities - 1,
+            today_opportunities = CASE WHEN today_date = date('now')
+                THEN today_opportunities - IFNULL(date(OLD.created_at) = today_date, 0) ELSE 0 END,
+            today_date = date('now'),
+            max_profit_rate = CASE WHEN OLD.profit_rate >= max_profit_rate
+                THEN (SELECT MAX(profit_rate) FROM opportunities INDEXED BY idx_opp_active_profit WHERE status = 'active')
+                ELSE max_profit_rate END
+        WHERE id = 1;
+    END;
+
+    -- 更新 = 移除旧行的贡献 + 加入新行的贡献
+    CREATE TRIGGER IF NOT EXISTS trg_stats_opp_update AFTER UPDATE OF status, created_at, profit_rate ON opportunities
+    WHEN OLD.status = 'active' OR NEW.status = 'active'
+    BEGIN
+        UPDATE stats SET
+            total_opportunities = total_opportunities - 1,
+            today_opportunities = CASE WHEN today_date = date('now')
+                THEN today_opportunities - IFNULL(date(OLD.created_at) = today_date, 0) ELSE 0 END,
+            today_date = date('now'),
+            max_profit_rate = CASE WHEN OLD.profit_rate >= max_profit_rate
+                THEN (SELECT MAX(profit_rate) FROM opportunities INDEXED BY idx_opp_active_profit WHERE status = 'active')
+                ELSE max_profit_rate END
+        WHERE id = 1 AND OLD.status = 'active';
+
+        UPDATE stats SET
+            total_opportunities = total_opportunities + 1,
+            today_opportunities = CASE WHEN today_date = date('now') THEN today_opportunities ELSE 0 END
+                + IFNULL(date(NEW.created_at) = date('now'), 0),
+            today_date = date('now'),
+            max_profit_rate = CASE WHEN max_profit_rate IS NULL OR NEW.profit_rate > max_profit_rate
+                THEN NEW.profit_rate ELSE max_profit_rate END
+        WHERE id = 1 AND NEW.status = 'active';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stats_scan_insert AFTER INSERT ON scan_logs
+    BEGIN
+        UPDATE stats SET
+            total_scans = total_scans + 1,
+            last_scan = CASE WHEN last_scan IS NULL OR NEW.finished_at > last_scan
+                THEN NEW.finished_at ELSE last_scan END
+        WHERE id = 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stats_scan_delete AFTER DELETE ON scan_logs
+    BEGIN
+        UPDATE stats SET
+            total_scans = total_scans - 1,
+            last_scan = CASE WHEN OLD.finished_at >= last_scan
+                THEN (SELECT MAX(finished_at) FROM scan_logs) ELSE last_scan END
+        WHERE id = 1;
+    END;
+"""
+
+
+# 旧库升级：为已存在的表补齐后续新增的列
+_ADDED_COLUMNS = {
+    "price_history": {"wine_id": "INTEGER REFERENCES wines(id)"},
+    "scan_logs": {"timed_out": "TEXT", "deferred": "TEXT"},
+    "scan_jobs": {"cancel_requested": "INTEGER DEFAULT 0"},
+    "scan_job_items": {
+        "lease_owner": "TEXT",
+        "lease_expires_at": "REAL",
+        "attempts": "INTEGER DEFAULT 0",
+    },
+    "scan_cache": {
+        "scans": "INTEGER DEFAULT 0",
+        "opportunity_hits": "INTEGER DEFAULT 0",
+        "last_profit_rate": "REAL",
+    },
+}
+
+
+async def _migrate(db):
+    for table, columns in _ADDED_COLUMNS.items():
+        cursor = await db.execute(f"PRAGMA table_info({table})")
+        existing = {row["name"] for row in await cursor.fetchall()}
+        for column, col_type in columns.items():
+            if column not in existing:
+                await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+                logger.info(f"数据库升级: {table}.{column}")
+
+    # 同酒名只保留一条 active 机会（旧版先查后写，并发扫描可能插入了重复行），再建唯一部分索引
+    cursor = await db.execute(
+        """UPDATE opportunities SET status = 'superseded' WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY wine_name ORDER BY created_at DESC, id DESC
+                ) AS rn
+                FROM opportunities WHERE status = 'active'
+            ) WHERE rn > 1
+        )"""
+    )
+    if cursor.rowcount > 0:
+        logger.info(f"数据库升级: 合并 {cursor.rowcount} 条重复的 active 机会")
+    await db.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_opp_active_wine ON opportunities(wine_name) WHERE status = 'active'"
+    )
+
+    # 价格历史按酒款 id 关联：旧记录按酒名补齐 wines 与 wine_id，
+    # 再用 (wine_id, recorded_at, ...) 覆盖索引取代只能前缀匹配酒名的旧索引
+    await db.execute(
+        "INSERT OR IGNORE INTO wines (name) SELECT DISTINCT wine_name FROM price_history WHERE wine_id IS NULL"
+    )
+    cursor = await db.execute(
+        """UPDATE price_history SET wine_id = (SELECT id FROM wines WHERE name = price_history.wine_name)
+        WHERE wine_id IS NULL"""
+    )
+    if cursor.rowcount > 0:
+        logger.info(f"数据库升级: {cursor.rowcount} 条价格历史关联酒款 id")
+    await db.execute(
+        """CREATE INDEX IF NOT EXISTS idx_price_wine_time ON price_history
+        (wine_id, recorded_at, price, currency, source, merchant, country, vintage)"""
+    )
+    await db.execute("DROP INDEX IF EXISTS idx_price_wine")
+
+    # 统计行不存在（新库或旧库升级）时按现有数据建立
+    cursor = await db.execute("SELECT 1 FROM stats WHERE id = 1")
+    if await cursor.fetchone() is None:
+        await _rebuild_stats(db)
 
 
 async def save_opportunity(opp: dict) -> int:
     """保存一条捡漏机会（同酒名去重：更新已有记录或新增）"""
-    db = await get_db()
-    try:
-        # 先查是否已有同酒名的 active 记录
+    return (await save_opportunities([opp]))[0]
+
+
+async def save_opportunities(opps: list) -> list:
+    """批量保存捡漏机会，返回与输入顺序对应的 id"""
+    async with writer() as db:
+        ids = await _write_opportunities(db, opps)
+        await db.commit()
+        return ids
+
+
+_OPP_COLUMNS = (
+    "wine_name", "vintage", "region", "category", "buy_price", "buy_currency",
+    "buy_merchant", "buy_country", "buy_url", "sell_price_hk", "total_cost",
+    "profit_rate", "score", "data_source",
+)
+# 每条语句最多写入的行数（旧版 SQLite 单语句参数上限 999）
+_OPP_CHUNK = 999 // len(_OPP_COLUMNS)
+
+
+def _opp_row(opp: dict) -> tuple:
+    return (
+        opp["wine_name"], opp.get("vintage"), opp.get("region"),
+        opp.get("category"), opp["buy_price"], opp.get("buy_currency", "USD"),
+        opp.get("buy_merchant"), opp.get("buy_country"), opp.get("buy_url"),
+        opp.get("sell_price_hk"), opp.get("total_cost"),
+        opp.get("profit_rate"), opp.get("score"), opp.get("data_source", "wine-searcher"),
+    )
+
+
+async def _write_opportunities(db, opps: list) -> list:
+    """
+    单条 UPSERT 语句写入：同酒名已有 active 记录（唯一部分索引 idx_opp_active_wine）时原地更新，否则新增
+    不再先查后写，并发扫描也不会插入重复的 active 记录
+    """
+    ids = {}
+    placeholders = "(" + ", ".join("?" * len(_OPP_COLUMNS)) + ")"
+    for start in range(0, len(opps), _OPP_CHUNK):
+        chunk = opps[start:start + _OPP_CHUNK]
         cursor = await db.execute(
-            "SELECT id FROM opportunities WHERE wine_name = ? AND status = 'active'",
-            (opp["wine_name"],)
+            f"""INSERT INTO opportunities ({", ".join(_OPP_COLUMNS)})
+            VALUES {", ".join([placeholders] * len(chunk))}
+            ON CONFLICT(wine_name) WHERE status = 'active' DO UPDATE SET
+                buy_price=excluded.buy_price, buy_currency=excluded.buy_currency,
+                buy_merchant=excluded.buy_merchant, buy_country=excluded.buy_country,
+                buy_url=excluded.buy_url, sell_price_hk=excluded.sell_price_hk,
+                total_cost=excluded.total_cost, profit_rate=excluded.profit_rate,
+                score=excluded.score, data_source=excluded.data_source,
+                created_at=CURRENT_TIMESTAMP
+            RETURNING id, wine_name""",
+            [value for opp in chunk for value in _opp_row(opp)]
         )
-        existing = await cursor.fetchone()
-
-        if existing:
-            # 更新已有记录
-            await db.execute(
-                """UPDATE opportunities SET
-                    buy_price=?, buy_currency=?, buy_merchant=?, buy_country=?,
-                    buy_url=?, sell_price_hk=?, total_cost=?, profit_rate=?,
-                    score=?, data_source=?, created_at=CURRENT_TIMESTAMP
-                WHERE id=?""",
-                (
-                    opp["buy_price"], opp.get("buy_currency", "USD"),
-                    opp.get("buy_merchant"), opp.get("buy_country"), opp.get("buy_url"),
-                    opp.get("sell_price_hk"), opp.get("total_cost"),
-                    opp.get("profit_rate"), opp.get("score"),
-                    opp.get("data_source", "wine-searcher"), existing["id"]
-                )
-            )
-            await db.commit()
-            return existing["id"]
-        else:
-            # 新增记录
-            cursor = await db.execute(
-                """INSERT INTO opportunities
-                (wine_name, vintage, region, category, buy_price, buy_currency,
-                 buy_merchant, buy_country, buy_url, sell_price_hk, total_cost,
-                 profit_rate, score, data_source)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    opp["wine_name"], opp.get("vintage"), opp.get("region"),
-                    opp.get("category"), opp["buy_price"], opp.get("buy_currency", "USD"),
-                    opp.get("buy_merchant"), opp.get("buy_country"), opp.get("buy_url"),
-                    opp.get("sell_price_hk"), opp.get("total_cost"),
-                    opp.get("profit_rate"), opp.get("score"), opp.get("data_source", "wine-searcher")
-                )
-            )
-            await db.commit()
-            return cursor.lastrowid
-    finally:
-        await db.close()
+        # RETURNING 的行序不保证与 VALUES 一致，按酒名对应回去
+        ids.update({row["wine_name"]: row["id"] for row in await cursor.fetchall()})
+    return [ids[opp["wine_name"]] for opp in opps]
 
 
 async def get_opportunities(limit: int = 50, status: str = "active", min_profit: float = 0):
     """获取捡漏机会列表"""
-    db = await get_db()
-    try:
+    async with reader() as db:
         cursor = await db.execute(
             """SELECT * FROM opportunities
             WHERE status = ? AND profit_rate >= ?
@@ -155,45 +410,37 @@ async def get_opportunities(limit: int = 50, status: str = "active", min_profit:
         )
         rows = await cursor.fetchall()
         return [dict(row) for row in rows]
-    finally:
-        await db.close()
 
 
 async def get_opportunity_by_id(opp_id: int):
     """获取单条机会详情"""
-    db = await get_db()
-    try:
+    async with reader() as db:
         cursor = await db.execute("SELECT * FROM opportunities WHERE id = ?", (opp_id,))
         row = await cursor.fetchone()
         return dict(row) if row else None
-    finally:
-        await db.close()
 
 
 async def save_scan_log(log: dict) -> int:
     """保存扫描日志"""
-    db = await get_db()
-    try:
+    async with writer() as db:
         cursor = await db.execute(
             """INSERT INTO scan_logs
-            (scan_type, wines_scanned, opportunities_found, errors, started_at, duration_seconds)
-            VALUES (?, ?, ?, ?, ?, ?)""",
+            (scan_type, wines_scanned, opportunities_found, errors, timed_out, deferred,
+             started_at, duration_seconds)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
             (
                 log.get("scan_type"), log.get("wines_scanned", 0),
-                log.get("opportunities_found", 0), log.get("errors"),
-                log.get("started_at"), log.get("duration_seconds")
+                log.get("opportunities_found", 0), log.get("errors"), log.get("timed_out"),
+                log.get("deferred"), log.get("started_at"), log.get("duration_seconds")
             )
         )
         await db.commit()
         return cursor.lastrowid
-    finally:
-        await db.close()
 
 
 async def get_scan_logs(limit: int = 20):
     """获取扫描日志"""
-    db = await get_db()
-    try:
+    async with reader() as db:
         cursor = await db.execute(
             "SELECT * FROM scan_logs ORDER BY finished_at DESC LIMIT ?", (limit,)
         )
@@ -215,110 +462,543 @@ async def get_scan_logs(limit: int = 20):
             d["scan_time"] = d.get("finished_at")
             logs.append(d)
         return logs
-    finally:
-        await db.close()
 
 
 async def save_price_history(wine_name: str, vintage: str, price: float,
-                             currency: str, source: str, merchant: str, country: str):
+                             currency: str, source: str, merchant: str, country: str,
+                             recorded_at: str = None):
     """保存价格历史"""
-    db = await get_db()
-    try:
-        await db.execute(
-            """INSERT INTO price_history
-            (wine_name, vintage, price, currency, source, merchant, country)
-            VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (wine_name, vintage, price, currency, source, merchant, country)
-        )
+    async with writer() as db:
+        await _write_price_history(db, wine_name, vintage, price, currency, source, merchant, country,
+                                   recorded_at)
         await db.commit()
-    finally:
-        await db.close()
+
+
+async def _write_price_history(db, wine_name: str, vintage: str, price: float,
+                               currency: str, source: str, merchant: str, country: str,
+                               recorded_at: str = None):
+    """
+    recorded_at: 价格所在页面的抓取时间（UTC，'YYYY-MM-DD HH:MM:SS'），默认当前时间；
+    同一款酒已有该时间的记录时不再写入（页面缓存命中时重复扫到的是同一个价格点）
+    """
+    wine = await _find_wine(db, wine_name)
+    if wine is None:
+        await db.execute("INSERT OR IGNORE INTO wines (name) VALUES (?)", (_clean_name(wine_name),))
+        wine = await _find_wine(db, wine_name)
+    await db.execute(
+        """INSERT INTO price_history
+        (wine_name, wine_id, vintage, price, currency, source, merchant, country, recorded_at)
+        SELECT ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP)
+        WHERE ? IS NULL OR NOT EXISTS (
+            SELECT 1 FROM price_history WHERE wine_id = ? AND recorded_at = ?
+        )""",
+        (wine["name"], wine["id"], vintage, price, currency, source, merchant, country, recorded_at,
+         recorded_at, wine["id"], recorded_at)
+    )
 
 
 async def get_price_history(wine_name: str, limit: int = 100):
-    """获取某款酒的价格历史"""
-    db = await get_db()
-    try:
+    """获取某款酒的价格历史（标准酒名或别名精确匹配，忽略大小写）"""
+    async with reader() as db:
+        wine = await _find_wine(db, wine_name)
+        if wine is None:
+            return []
+        # 只读覆盖索引 idx_price_wine_time 中的列，不回表
         cursor = await db.execute(
-            """SELECT * FROM price_history
-            WHERE wine_name LIKE ?
+            """SELECT id, vintage, price, currency, source, merchant, country, recorded_at
+            FROM price_history WHERE wine_id = ?
             ORDER BY recorded_at DESC LIMIT ?""",
-            (f"%{wine_name}%", limit)
+            (wine["id"], limit)
+        )
+        rows = await cursor.fetchall()
+        return [{**dict(row), "wine_id": wine["id"], "wine_name": wine["name"]} for row in rows]
+
+
+# 酒款标识（wines 表 + 别名）
+def _clean_name(wine_name: str) -> str:
+    return " ".join(wine_name.split())
+
+
+async def _find_wine(db, wine_name: str):
+    """按标准酒名或别名查找酒款，返回 {id, name}"""
+    name = _clean_name(wine_name)
+    cursor = await db.execute(
+        """SELECT id, name FROM wines WHERE name = ?
+        UNION ALL
+        SELECT w.id, w.name FROM wine_aliases a JOIN wines w ON w.id = a.wine_id WHERE a.alias = ?
+        LIMIT 1""",
+        (name, name)
+    )
+    return await cursor.fetchone()
+
+
+async def register_wines(wines: list, aliases: dict = None):
+    """
+    登记酒款清单与别名，aliases 为 {别名: 标准酒名}
+    已存在的酒款只补齐缺失的产区/分类（升级时按价格历史补建的酒款没有这两项），别名已存在的跳过
+    """
+    async with writer() as db:
+        await db.executemany(
+            """INSERT INTO wines (name, region, category) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                region=COALESCE(wines.region, excluded.region),
+                category=COALESCE(wines.category, excluded.category)""",
+            [(_clean_name(w["name"]), w.get("region"), w.get("category")) for w in wines]
+        )
+        await db.executemany(
+            """INSERT INTO wine_aliases (alias, wine_id)
+            SELECT ?, id FROM wines WHERE name = ?
+            ON CONFLICT(alias) DO NOTHING""",
+            [(_clean_name(alias), _clean_name(name)) for alias, name in (aliases or {}).items()]
         )
+        await db.commit()
+
+
+# 扫描跳过缓存（重启后继续沿用，避免重新全量扫描）
+async def load_scan_cache() -> list:
+    """读取全部扫描缓存记录"""
+    async with reader() as db:
+        cursor = await db.execute("SELECT * FROM scan_cache")
         rows = await cursor.fetchall()
         return [dict(row) for row in rows]
-    finally:
-        await db.close()
+
+
+async def get_scan_cache_backfill() -> list:
+    """
+    还没有 scan_cache 记录的酒款，从价格历史与机会记录估算扫描历史（旧库升级后给优先级调度一个起点）：
+      - scans: 价格点数（每次扫到价格写一条）与机会数取大；opportunity_hits: 机会数
+      - last_profit_rate: 最近一条机会的利润率；miss_streak: 最近一条机会之后的价格点数
+      - last_at: 最近一个价格点或机会的时间（UTC）；active: 是否有仍有效的机会
+    """
+    async with reader() as db:
+        cursor = await db.execute(
+            """WITH ph AS (
+                SELECT wine_name, COUNT(*) AS points, MAX(recorded_at) AS last_at
+                FROM price_history GROUP BY wine_name
+            ), opp AS (
+                SELECT wine_name, COUNT(*) AS hits, MAX(created_at) AS last_at,
+                       MAX(status = 'active') AS active
+                FROM opportunities GROUP BY wine_name
+            ), names AS (
+                SELECT wine_name FROM ph UNION SELECT wine_name FROM opp
+            )
+            SELECT n.wine_name,
+                   MAX(COALESCE(ph.points, 0), COALESCE(opp.hits, 0)) AS scans,
+                   COALESCE(opp.hits, 0) AS opportunity_hits,
+                   COALESCE(opp.active, 0) AS active,
+                   (SELECT profit_rate FROM opportunities o WHERE o.wine_name = n.wine_name
+                    ORDER BY o.created_at DESC, o.id DESC LIMIT 1) AS last_profit_rate,
+                   (SELECT COUNT(*) FROM price_history p WHERE p.wine_name = n.wine_name
+                    AND p.recorded_at > COALESCE(opp.last_at, '')) AS miss_streak,
+                   MAX(COALESCE(ph.last_at, ''), COALESCE(opp.last_at, '')) AS last_at
+            FROM names n
+            LEFT JOIN ph ON ph.wine_name = n.wine_name
+            LEFT JOIN opp ON opp.wine_name = n.wine_name
+            WHERE n.wine_name NOT IN (SELECT wine_name FROM scan_cache)"""
+        )
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+
+async def save_scan_cache_entry(wine_name: str, scanned_at: datetime,
+                                had_opportunity: bool, miss_streak: int,
+                                scans: int = 0, opportunity_hits: int = 0,
+                                last_profit_rate: float = None):
+    """写入单款酒的扫描缓存（同酒名覆盖）"""
+    async with writer() as db:
+        await _write_scan_cache_entry(db, wine_name, scanned_at, had_opportunity, miss_streak,
+                                      scans, opportunity_hits, last_profit_rate)
+        await db.commit()
+
+
+async def _write_scan_cache_entry(db, wine_name: str, scanned_at: datetime,
+                                  had_opportunity: bool, miss_streak: int,
+                                  scans: int = 0, opportunity_hits: int = 0,
+                                  last_profit_rate: float = None):
+    await db.execute(
+        """INSERT INTO scan_cache
+        (wine_name, scanned_at, had_opportunity, miss_streak, scans, opportunity_hits, last_profit_rate)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(wine_name) DO UPDATE SET
+            scanned_at=excluded.scanned_at,
+            had_opportunity=excluded.had_opportunity,
+            miss_streak=excluded.miss_streak,
+            scans=excluded.scans,
+            opportunity_hits=excluded.opportunity_hits,
+            last_profit_rate=excluded.last_profit_rate""",
+        (wine_name, scanned_at.isoformat(), int(had_opportunity), miss_streak,
+         scans, opportunity_hits, last_profit_rate)
+    )
+
+
+async def get_price_series(days: int = None, without_stats: bool = False) -> dict:
+    """
+    每款酒的价格序列 {wine_name: [(recorded_at, price), ...]}（按时间升序）
+    days: 只取最近天数，None 表示全部历史
+    without_stats: 只取还没有 price_stats 记录的酒款（启动补齐用）
+    """
+    conditions, params = ["price > 0"], []
+    if days:
+        conditions.append("recorded_at >= datetime('now', ?)")
+        params.append(f"-{days} day")
+    if without_stats:
+        conditions.append("wine_name NOT IN (SELECT wine_name FROM price_stats)")
+    async with reader() as db:
+        cursor = await db.execute(
+            f"""SELECT wine_name, recorded_at, price FROM price_history
+            WHERE {" AND ".join(conditions)}
+            ORDER BY wine_id, recorded_at""",
+            params
+        )
+        series: dict = {}
+        for row in await cursor.fetchall():
+            series.setdefault(row["wine_name"], []).append((row["recorded_at"], row["price"]))
+        return series
+
+
+# 扫描任务 — 基于租约的工作队列
+# 多个进程（uvicorn 多 worker / 同一数据库文件上的多个实例）共同完成同一个任务：
+#   - 每款酒用一条 UPDATE ... RETURNING 原子领取，并带租约到期时间
+#   - 领取者定期续租；进程崩溃后租约过期，其他 worker 重新领取
+#   - 每款酒扫完即写入结果（检查点），只有仍持有租约的 worker 能写入
+async def create_scan_job(job: dict, wines: list):
+    """
+    新建扫描任务及其待扫酒款，返回任务 id
+    已有进行中的任务时不创建，返回 None（判断与插入在同一条语句内，多进程安全）
+    """
+    async with writer() as db:
+        cursor = await db.execute(
+            """INSERT INTO scan_jobs
+            (scan_type, profit_threshold, notify, concurrency, skipped, deferred, started_at)
+            SELECT ?, ?, ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM scan_jobs WHERE status = 'running')""",
+            (
+                job.get("scan_type"), job.get("profit_threshold"), int(job.get("notify", True)),
+                job.get("concurrency"), job.get("skipped", 0), job.get("deferred"), job.get("started_at")
+            )
+        )
+        if cursor.rowcount == 0:
+            return None
+        job_id = cursor.lastrowid
+        await db.executemany(
+            """INSERT INTO scan_job_items (job_id, wine_name, position, region, category)
+            VALUES (?, ?, ?, ?, ?)""",
+            [
+                (job_id, w["name"], i, w.get("region", "default"), w.get("category", ""))
+                for i, w in enumerate(wines)
+            ]
+        )
+        await db.commit()
+        return job_id
+
+
+async def claim_scan_job_item(job_id: int, worker_id: str, lease_seconds: float,
+                              max_attempts: int):
+    """
+    领取下一款待扫的酒（未领取的，或租约已过期的），返回该行；没有可领取的返回 None
+    任务已请求取消时不再发放
+    """
+    now = time.time()
+    async with writer() as db:
+        cursor = await db.execute(
+            """UPDATE scan_job_items
+            SET status = 'leased', lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1
+            WHERE rowid = (
+                SELECT i.rowid FROM scan_job_items i JOIN scan_jobs j ON j.id = i.job_id
+                WHERE i.job_id = ? AND j.status = 'running' AND j.cancel_requested = 0
+                  AND i.attempts < ?
+                  AND (i.status = 'pending' OR (i.status = 'leased' AND i.lease_expires_at < ?))
+                ORDER BY i.position LIMIT 1
+            )
+            RETURNING *""",
+            (worker_id, now + lease_seconds, job_id, max_attempts, now)
+        )
+        row = await cursor.fetchone()
+        await db.commit()
+        return dict(row) if row else None
+
+
+async def renew_scan_leases(job_id: int, worker_id: str, lease_seconds: float) -> int:
+    """续租本 worker 持有的全部租约，返回续租条数"""
+    async with writer() as db:
+        cursor = await db.execute(
+            """UPDATE scan_job_items SET lease_expires_at = ?
+            WHERE job_id = ? AND lease_owner = ? AND status = 'leased'""",
+            (time.time() + lease_seconds, job_id, worker_id)
+        )
+        await db.commit()
+        return cursor.rowcount
+
+
+async def next_scan_lease_expiry(job_id: int):
+    """进行中任务里仍有效的租约中最早的到期时间（time.time()）；没有有效租约返回 None"""
+    async with reader() as db:
+        cursor = await db.execute(
+            """SELECT MIN(i.lease_expires_at) AS expires_at
+            FROM scan_job_items i JOIN scan_jobs j ON j.id = i.job_id
+            WHERE i.job_id = ? AND j.status = 'running'
+              AND i.status = 'leased' AND i.lease_expires_at >= ?""",
+            (job_id, time.time())
+        )
+        row = await cursor.fetchone()
+        return row["expires_at"] if row else None
+
+
+async def update_scan_job_item(job_id: int, wine_name: str, status: str, worker_id: str,
+                               opportunity: bool = False, error: str = None) -> bool:
+    """记录单款酒的扫描结果（检查点）；租约已被他人接手时不写入，返回 False"""
+    async with writer() as db:
+        cursor = await db.execute(
+            """UPDATE scan_job_items
+            SET status=?, opportunity=?, error=?, lease_expires_at=NULL, updated_at=CURRENT_TIMESTAMP
+            WHERE job_id=? AND wine_name=? AND status='leased' AND lease_owner=?""",
+            (status, int(opportunity), error, job_id, wine_name, worker_id)
+        )
+        await db.commit()
+        return cursor.rowcount > 0
+
+
+async def finish_scan_job(job_id: int, status: str = None) -> bool:
+    """
+    结束扫描任务，返回是否由本次调用结束（多个 worker 中只有一个会得到 True）
+    status 为空时自动判断：没有未完成的酒款 → completed；已请求取消且没有在途酒款 → cancelled
+    """
+    async with writer() as db:
+        if status:
+            cursor = await db.execute(
+                """UPDATE scan_jobs SET status=?, finished_at=CURRENT_TIMESTAMP
+                WHERE id=? AND status='running'""",
+                (status, job_id)
+            )
+        else:
+            # 租约过期且已达重试上限的酒款不会再被领取，视为已结束
+            cursor = await db.execute(
+                """UPDATE scan_jobs
+                SET status = CASE WHEN cancel_requested = 1 THEN 'cancelled' ELSE 'completed' END,
+                    finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'running' AND NOT EXISTS (
+                    SELECT 1 FROM scan_job_items i
+                    WHERE i.job_id = scan_jobs.id
+                      AND ((i.status = 'leased' AND i.lease_expires_at >= ?)
+                           OR (scan_jobs.cancel_requested = 0 AND i.attempts < ?
+                               AND i.status IN ('pending', 'leased')))
+                )""",
+                (job_id, time.time(), SCAN_MAX_ATTEMPTS)
+            )
+        finished = cursor.rowcount > 0
+        if finished:
+            await db.execute(
+                """UPDATE scan_job_items SET status = 'error', error = '超过最大重试次数', lease_expires_at = NULL
+                WHERE job_id = ? AND status = 'leased'""",
+                (job_id,)
+            )
+        await db.commit()
+        return finished
+
+
+async def request_scan_job_cancel(job_id: int) -> bool:
+    async with writer() as db:
+        cursor = await db.execute(
+            "UPDATE scan_jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,)
+        )
+        await db.commit()
+        return cursor.rowcount > 0
+
+
+async def get_scan_job(job_id: int):
+    """读取扫描任务及全部酒款（按原扫描顺序）"""
+    async with reader() as db:
+        cursor = await db.execute("SELECT * FROM scan_jobs WHERE id = ?", (job_id,))
+        row = await cursor.fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        cursor = await db.execute(
+            "SELECT * FROM scan_job_items WHERE job_id = ? ORDER BY position", (job_id,)
+        )
+        job["items"] = [dict(r) for r in await cursor.fetchall()]
+        return job
+
+
+async def get_latest_scan_job():
+    """最近一个扫描任务（任意状态）"""
+    async with reader() as db:
+        cursor = await db.execute("SELECT id FROM scan_jobs ORDER BY id DESC LIMIT 1")
+        row = await cursor.fetchone()
+    return await get_scan_job(row["id"]) if row else None
+
+
+async def get_active_scan_job():
+    """进行中的扫描任务（可能由其他进程发起，或上次进程中断留下）"""
+    async with reader() as db:
+        cursor = await db.execute(
+            "SELECT id FROM scan_jobs WHERE status = 'running' ORDER BY id DESC LIMIT 1"
+        )
+        row = await cursor.fetchone()
+    return await get_scan_job(row["id"]) if row else None
+
+
+# 价格波动统计（增量维护，见 price_stats.py）
+async def load_price_stats() -> list:
+    async with reader() as db:
+        cursor = await db.execute("SELECT * FROM price_stats")
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+
+async def save_price_stats(wine_name: str, stats: dict):
+    """写入单款酒的价格统计（同酒名覆盖）"""
+    async with writer() as db:
+        await _write_price_stats(db, wine_name, stats)
+        await db.commit()
+
+
+async def _write_price_stats(db, wine_name: str, stats: dict):
+    await db.execute(
+        """INSERT INTO price_stats (wine_name, last_price, last_at, drift, variance, samples)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(wine_name) DO UPDATE SET
+            last_price=excluded.last_price,
+            last_at=excluded.last_at,
+            drift=excluded.drift,
+            variance=excluded.variance,
+            samples=excluded.samples""",
+        (wine_name, stats["last_price"], stats["last_at"], stats["drift"],
+         stats["variance"], stats["samples"])
+    )
+
+
+# 请求预算令牌桶（见 scan_planner.RequestBudget）
+# 存在数据库里而不是进程内存：多个 worker 进程共用同一份每小时预算，而不是各自一份
+# 每小时补充 per_hour 个，最多攒一小时的量；从未使用过时视为满桶
+async def get_request_budget(per_hour: float) -> float:
+    """当前可用的请求预算"""
+    async with reader() as db:
+        cursor = await db.execute(
+            "SELECT MIN(?, tokens + MAX(? - updated_at, 0) / 3600.0 * ?) AS tokens FROM request_budget WHERE id = 1",
+            (per_hour, time.time(), per_hour)
+        )
+        row = await cursor.fetchone()
+        return row["tokens"] if row else per_hour
+
+
+async def consume_request_budget(per_hour: float, amount: float):
+    """补充后扣除 amount（负数为退还），补充与扣除在同一条语句内完成，多进程安全"""
+    async with writer() as db:
+        await db.execute(
+            """INSERT INTO request_budget (id, tokens, updated_at) VALUES (1, ? - ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                tokens = MIN(?, tokens + MAX(excluded.updated_at - updated_at, 0) / 3600.0 * ?) - ?,
+                updated_at = excluded.updated_at""",
+            (per_hour, amount, time.time(), per_hour, per_hour, amount)
+        )
+        await db.commit()
+
+
+# 批量写入（write_behind 队列攒批后一个事务落库）
+_BATCH_WRITERS = {
+    "price_history": _write_price_history,
+    "scan_cache": _write_scan_cache_entry,
+    "price_stats": _write_price_stats,
+}
+
+
+async def write_batch(records: list) -> list:
+    """
+    在一个事务中写入 [(kind, kwargs), ...]，返回每条记录的结果（机会记录为 id）
+    任一条失败则整批回滚，由调用方决定是否逐条重试
+    """
+    async with writer() as db:
+        results = [None] * len(records)
+        opp_indexes = []
+        for i, (kind, kwargs) in enumerate(records):
+            if kind == "opportunity":
+                opp_indexes.append(i)
+            else:
+                results[i] = await _BATCH_WRITERS[kind](db, **kwargs)
+        # 机会记录合并成一条 UPSERT 语句
+        if opp_indexes:
+            ids = await _write_opportunities(db, [records[i][1]["opp"] for i in opp_indexes])
+            for i, opp_id in zip(opp_indexes, ids):
+                results[i] = opp_id
+        await db.commit()
+        return results
 
 
 # 监控酒单操作
 async def add_to_watchlist(wine_name: str, region: str = None,
                            target_price: float = None, notes: str = None) -> int:
-    db = await get_db()
-    try:
+    async with writer() as db:
         cursor = await db.execute(
             "INSERT INTO watchlist (wine_name, region, target_price, notes) VALUES (?, ?, ?, ?)",
             (wine_name, region, target_price, notes)
         )
         await db.commit()
         return cursor.lastrowid
-    finally:
-        await db.close()
 
 
 async def get_watchlist():
-    db = await get_db()
-    try:
+    async with reader() as db:
         cursor = await db.execute("SELECT * FROM watchlist WHERE active = 1 ORDER BY created_at DESC")
         rows = await cursor.fetchall()
         return [dict(row) for row in rows]
-    finally:
-        await db.close()
 
 
 async def remove_from_watchlist(item_id: int):
-    db = await get_db()
-    try:
+    async with writer() as db:
         await db.execute("UPDATE watchlist SET active = 0 WHERE id = ?", (item_id,))
         await db.commit()
-    finally:
-        await db.close()
 
 
 async def get_stats():
-    """获取统计数据"""
-    db = await get_db()
-    try:
-        stats = {}
-        # 今日机会数
-        cursor = await db.execute(
-            "SELECT COUNT(*) as cnt FROM opportunities WHERE date(created_at) = date('now') AND status = 'active'"
-        )
+    """获取统计数据（读物化的 stats 行）"""
+    async with reader() as db:
+        cursor = await db.execute("SELECT *, date('now') AS today FROM stats WHERE id = 1")
         row = await cursor.fetchone()
-        stats["today_opportunities"] = row["cnt"] if row else 0
+    if row is None:
+        return {"today_opportunities": 0, "total_opportunities": 0, "max_profit_rate": 0,
+                "last_scan": None, "total_scans": 0}
+    return {
+        "today_opportunities": row["today_opportunities"] if row["today_date"] == row["today"] else 0,
+        "total_opportunities": row["total_opportunities"],
+        "max_profit_rate": round(row["max_profit_rate"], 1) if row["max_profit_rate"] else 0,
+        "last_scan": row["last_scan"],
+        "total_scans": row["total_scans"],
+    }
+
+
+async def rebuild_stats() -> dict:
+    """按全表重新计算统计行（修正增量维护的偏差）"""
+    async with writer() as db:
+        await _rebuild_stats(db)
+        await db.commit()
+    return await get_stats()
 
-        # 总机会数
-        cursor = await db.execute("SELECT COUNT(*) as cnt FROM opportunities WHERE status = 'active'")
-        row = await cursor.fetchone()
-        stats["total_opportunities"] = row["cnt"] if row else 0
 
-        # 最高利润率
-        cursor = await db.execute(
-            "SELECT MAX(profit_rate) as max_profit FROM opportunities WHERE status = 'active'"
-        )
-        row = await cursor.fetchone()
-        stats["max_profit_rate"] = round(row["max_profit"], 1) if row and row["max_profit"] else 0
+async def _rebuild_stats(db):
+    await db.execute(
+        """INSERT OR REPLACE INTO stats
+        (id, total_opportunities, today_date, today_opportunities, max_profit_rate, total_scans, last_scan)
+        SELECT 1,
+            (SELECT COUNT(*) FROM opportunities WHERE status = 'active'),
+            date('now'),
+            (SELECT COUNT(*) FROM opportunities WHERE status = 'active' AND date(created_at) = date('now')),
+            (SELECT MAX(profit_rate) FROM opportunities WHERE status = 'active'),
+            (SELECT COUNT(*) FROM scan_logs),
+            (SELECT MAX(finished_at) FROM scan_logs)"""
+    )
 
-        # 最近扫描时间
-        cursor = await db.execute("SELECT finished_at FROM scan_logs ORDER BY finished_at DESC LIMIT 1")
-        row = await cursor.fetchone()
-        stats["last_scan"] = row["finished_at"] if row else None
 
-        # 扫描总次数
-        cursor = await db.execute("SELECT COUNT(*) as cnt FROM scan_logs")
-        row = await cursor.fetchone()
-        stats["total_scans"] = row["cnt"] if row else 0
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    if sys.argv[1:] != ["rebuild-stats"]:
+        print("用法: python database.py rebuild-stats")
+        sys.exit(1)
+
+    async def _main():
+        await init_db()
+        print(json.dumps(await rebuild_stats(), ensure_ascii=False, indent=2))
 
-        return stats
-    finally:
-        await db.close()
+    asyncio.run(_main())
@@ -0,0 +1,164 @@
+"""
+SQLite 连接池 — 应用生命周期内复用的长连接
+- 1 个写连接（asyncio.Lock 串行化写事务）+ N 个只读连接
+- WAL 模式：读连接不会被扫描写入阻塞
+- 连接打开时统一设置 pragma（synchronous / mmap / cache_size / busy_timeout）
+- 连接池未初始化时（命令行脚本、单独调试）退回每次临时打开连接，行为与之前一致
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+# ── 配置 ──────────────────────────────────
+DB_READERS = int(os.getenv("DB_READERS", "4"))
+DB_MMAP_MB = int(os.getenv("DB_MMAP_MB", "64"))
+DB_CACHE_MB = int(os.getenv("DB_CACHE_MB", "16"))
+# 多进程同时写入时等待写锁的最长时间（毫秒）
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+
+async def connect(path: str, readonly: bool = False) -> aiosqlite.Connection:
+    """打开一个连接并设置 pragma"""
+    db = await aiosqlite.connect(path)
+    db.row_factory = aiosqlite.Row
+    await db.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    await db.execute("PRAGMA synchronous = NORMAL")
+    await db.execute(f"PRAGMA mmap_size = {DB_MMAP_MB * 1024 * 1024}")
+    # 负数表示以 KiB 为单位
+    await db.execute(f"PRAGMA cache_size = -{DB_CACHE_MB * 1024}")
+    if readonly:
+        await db.execute("PRAGMA query_only = 1")
+    return db
+
+
+class SQLitePool:
+    """一写多读连接池"""
+
+    def __init__(self, path: str, readers: int = DB_READERS):
+        self.path = path
+        self.size = max(1, readers)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: Optional[asyncio.Queue] = None
+        self._all_readers: list = []
+        self.stats = {"reads": 0, "writes": 0, "read_wait_ms": 0.0, "write_wait_ms": 0.0,
+                      "max_write_wait_ms": 0.0}
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def open(self):
+        self._writer = await connect(self.path)
+        cursor = await self._writer.execute("PRAGMA journal_mode = WAL")
+        mode = (await cursor.fetchone())[0]
+        if mode.lower() != "wal":
+            logger.warning(f"数据库未能切换到 WAL 模式（当前 {mode}），读写会互相阻塞")
+        self._readers = asyncio.Queue()
+        for _ in range(self.size):
+            conn = await connect(self.path, readonly=True)
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+        logger.info(f"✅ 数据库连接池已就绪 (1 写 + {self.size} 读, journal_mode={mode})")
+
+    async def close(self):
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers.clear()
+        self._readers = None
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    @asynccontextmanager
+    async def write(self):
+        """独占写连接；异常时回滚未提交的事务，避免污染后续写入"""
+        started = time.perf_counter()
+        async with self._write_lock:
+            waited = (time.perf_counter() - started) * 1000
+            self.stats["writes"] += 1
+            self.stats["write_wait_ms"] += waited
+            self.stats["max_write_wait_ms"] = max(self.stats["max_write_wait_ms"], waited)
+            try:
+                yield self._writer
+            except BaseException:
+                if self._writer.in_transaction:
+                    await self._writer.rollback()
+                raise
+
+    @asynccontextmanager
+    async def read(self):
+        started = time.perf_counter()
+        conn = await self._readers.get()
+        self.stats["reads"] += 1
+        self.stats["read_wait_ms"] += (time.perf_counter() - started) * 1000
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    def snapshot(self) -> dict:
+        return {
+            "readers": self.size,
+            "idle_readers": self._readers.qsize() if self._readers else 0,
+            "writer_busy": self._write_lock.locked(),
+            **{k: round(v, 1) if isinstance(v, float) else v for k, v in self.stats.items()},
+        }
+
+
+# ── 进程级连接池 ──────────────────────────────────
+_pool: Optional[SQLitePool] = None
+_ephemeral = {"connections": 0}
+
+
+async def init_pool(path: str):
+    global _pool
+    if _pool is not None and _pool.is_open:
+        return
+    _pool = SQLitePool(path)
+    await _pool.open()
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+@asynccontextmanager
+async def _ephemeral_connection(path: str):
+    _ephemeral["connections"] += 1
+    db = await connect(path)
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+def read(path: str):
+    """只读连接：连接池已打开时借用读连接，否则临时打开一个"""
+    if _pool is not None and _pool.is_open:
+        return _pool.read()
+    return _ephemeral_connection(path)
+
+
+def write(path: str):
+    """写连接：连接池已打开时独占写连接，否则临时打开一个"""
+    if _pool is not None and _pool.is_open:
+        return _pool.write()
+    return _ephemeral_connection(path)
+
+
+def get_pool_stats() -> dict:
+    """连接池状态"""
+    if _pool is None or not _pool.is_open:
+        return {"enabled": False, "ephemeral_connections": _ephemeral["connections"]}
+    return {"enabled": True, "ephemeral_connections": _ephemeral["connections"], **_pool.snapshot()}
@@ -0,0 +1,67 @@
+"""
+截止时间（Deadline）— 单款酒抓取的总耗时预算
+由 run_full_scan 创建，经 search_wine_basic 一路传到每个抓取引擎：
+  - 请求超时取「默认超时」与「剩余预算」的较小值
+  - 重试前的等待按剩余预算缩短
+  - 预算耗尽时抛出 DeadlineExceeded，扫描记为超时而不是拖住整轮扫描
+"""
+import asyncio
+import math
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """预算耗尽"""
+
+
+class Deadline:
+    """截止时间；seconds=None 表示不限时"""
+
+    # 重试等待最多占用剩余预算的比例，留出时间给真正的请求
+    SLEEP_SHARE = 0.25
+    # 等待结束后剩余预算不足该秒数，就不值得再发请求了
+    MIN_USEFUL_SECONDS = 1.0
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds if seconds is not None else math.inf
+
+    @classmethod
+    def unbounded(cls) -> "Deadline":
+        return cls(None)
+
+    def copy(self) -> "Deadline":
+        clone = Deadline(self.budget)
+        clone.expires_at = self.expires_at
+        return clone
+
+    def extend_to(self, other: Optional["Deadline"]):
+        """放宽到不早于 other 的截止时间（other 为 None 表示不限时）"""
+        expires_at = other.expires_at if other is not None else math.inf
+        if expires_at > self.expires_at:
+            self.expires_at = expires_at
+            self.budget = other.budget if other is not None else None
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired:
+            raise DeadlineExceeded(f"超出 {self.budget:.0f}s 预算")
+
+    def timeout(self, default: float) -> float:
+        """本次请求可用的超时时间"""
+        self.check()
+        return min(default, self.remaining())
+
+    async def sleep(self, seconds: float):
+        """按剩余预算缩短的等待；等待后剩余预算不足以再发请求时抛出 DeadlineExceeded"""
+        self.check()
+        await asyncio.sleep(min(seconds, self.remaining() * self.SLEEP_SHARE))
+        if self.remaining() < self.MIN_USEFUL_SECONDS:
+            raise DeadlineExceeded(f"超出 {self.budget:.0f}s 预算")
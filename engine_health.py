@@ -0,0 +1,200 @@
+"""
+抓取引擎健康度追踪 — 熔断器 + 动态排序
+- 每个引擎记录成功率 EWMA、耗时 EWMA 和最近耗时样本
+- 连续失败达到阈值后熔断（open），冷却期内直接跳过，不再白白等待重试
+- 冷却结束进入半开（half_open），放行一次探测请求：成功则恢复，失败则加倍冷却后再次熔断
+- _smart_fetch 按健康度动态决定引擎尝试顺序
+"""
+import os
+import math
+import time
+import logging
+from collections import deque
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ── 配置 ──────────────────────────────────
+# 连续失败多少次熔断
+ENGINE_FAILURE_THRESHOLD = int(os.getenv("ENGINE_FAILURE_THRESHOLD", "3"))
+# 首次熔断冷却时间（秒），再次熔断时翻倍，最长 ENGINE_MAX_OPEN_SECONDS
+ENGINE_OPEN_SECONDS = int(os.getenv("ENGINE_OPEN_SECONDS", "300"))
+ENGINE_MAX_OPEN_SECONDS = int(os.getenv("ENGINE_MAX_OPEN_SECONDS", "3600"))
+
+# EWMA 平滑系数（越大越看重最近的结果）
+_ALPHA = 0.3
+# 闲置引擎成功率回升的时间常数（秒）
+_RECOVERY_SECONDS = 600
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class EngineHealth:
+    """单个引擎的健康状态"""
+
+    def __init__(self, name: str, weight: float = 1.0):
+        self.name = name
+        # 排序权重：免费引擎高、付费额度引擎低（健康度相同时优先免费引擎）
+        self.weight = weight
+        self.state = CLOSED
+        self.success_ewma = 1.0  # 乐观初始值，保证每个引擎都会被尝试
+        self.latency_ewma: Optional[float] = None
+        self.latencies = deque(maxlen=50)
+        self.consecutive_failures = 0
+        self.open_count = 0
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.calls = 0
+        self.last_call_at = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def allow_request(self) -> bool:
+        """是否放行本次请求（熔断期间跳过，冷却结束后只放行一个探测请求）"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() >= self.open_until:
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+            logger.info(f"🔌 引擎 {self.name} 冷却结束，进入半开探测")
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def _observe(self, ok: bool, latency: float):
+        self.calls += 1
+        self.last_call_at = time.monotonic()
+        self.success_ewma = _ALPHA * (1.0 if ok else 0.0) + (1 - _ALPHA) * self.success_ewma
+        self.latencies.append(latency)
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma = _ALPHA * latency + (1 - _ALPHA) * self.latency_ewma
+
+    def cancel_probe(self):
+        """请求被取消（如对冲请求中落败的一方）时释放半开探测名额，不计成败"""
+        self.probe_in_flight = False
+
+    def record_success(self, latency: float):
+        self._observe(True, latency)
+        self.successes += 1
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            logger.info(f"✅ 引擎 {self.name} 探测成功，熔断恢复")
+        self.state = CLOSED
+        self.open_count = 0
+        self.probe_in_flight = False
+
+    def record_failure(self, latency: float, reason: str = ""):
+        self._observe(False, latency)
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = reason or None
+        self.probe_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= ENGINE_FAILURE_THRESHOLD:
+            self._open()
+
+    def _open(self):
+        cooldown = min(ENGINE_OPEN_SECONDS * (2 ** self.open_count), ENGINE_MAX_OPEN_SECONDS)
+        self.open_count += 1
+        self.state = OPEN
+        self.open_until = time.monotonic() + cooldown
+        logger.warning(f"⛔ 引擎 {self.name} 熔断 {cooldown}s (连续失败 {self.consecutive_failures} 次)")
+
+    def latency_percentile(self, p: float) -> Optional[float]:
+        """最近耗时样本的分位数（p 取 0-1），无样本返回 None"""
+        if not self.latencies:
+            return None
+        samples = sorted(self.latencies)
+        index = min(len(samples) - 1, int(p * len(samples)))
+        return samples[index]
+
+    def effective_success(self) -> float:
+        """
+        成功率 EWMA 随闲置时间向 1 回升，
+        否则被降级的引擎永远排不到前面，也就永远没有机会证明自己恢复了
+        """
+        idle = time.monotonic() - self.last_call_at if self.last_call_at else 0.0
+        recovery = 1 - math.exp(-idle / _RECOVERY_SECONDS)
+        return self.success_ewma + (1 - self.success_ewma) * recovery
+
+    def score(self) -> float:
+        """排序得分：成功率 × 权重，耗时越长得分越低"""
+        latency = self.latency_ewma or 0.0
+        return self.effective_success() * self.weight / (1 + latency / 60)
+
+    def snapshot(self) -> dict:
+        p50 = self.latency_percentile(0.5)
+        p90 = self.latency_percentile(0.9)
+        return {
+            "name": self.name,
+            "state": self.state,
+            "score": round(self.score(), 3),
+            "success_rate_ewma": round(self.success_ewma, 3),
+            "weight": self.weight,
+            "latency_ewma": round(self.latency_ewma, 2) if self.latency_ewma is not None else None,
+            "latency_p50": round(p50, 2) if p50 is not None else None,
+            "latency_p90": round(p90, 2) if p90 is not None else None,
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "reopen_in_seconds": max(0, round(self.open_until - time.monotonic())) if self.state == OPEN else 0,
+            "last_error": self.last_error,
+        }
+
+
+class EngineRegistry:
+    """全部引擎的健康状态与动态排序"""
+
+    def __init__(self):
+        self._engines: Dict[str, EngineHealth] = {}
+
+    def register(self, name: str, weight: float = 1.0) -> EngineHealth:
+        if name not in self._engines:
+            self._engines[name] = EngineHealth(name, weight)
+        return self._engines[name]
+
+    def get(self, name: str) -> EngineHealth:
+        return self._engines[name]
+
+    def ordered(self, names: List[str]) -> List[str]:
+        """按得分从高到低排序；得分相同时保持传入的默认顺序"""
+        return sorted(names, key=lambda n: -self._engines[n].score())
+
+    def snapshot(self) -> List[dict]:
+        return [engine.snapshot() for engine in self._engines.values()]
+
+
+class HedgeBudget:
+    """对冲请求额度：滑动一小时窗口内最多发起 max_per_hour 次对冲"""
+
+    def __init__(self, max_per_hour: int):
+        self.max_per_hour = max_per_hour
+        self._launched = deque()
+        self.stats = {"launched": 0, "won": 0, "denied": 0}
+
+    def _trim(self):
+        cutoff = time.monotonic() - 3600
+        while self._launched and self._launched[0] < cutoff:
+            self._launched.popleft()
+
+    def available(self) -> bool:
+        self._trim()
+        return len(self._launched) < self.max_per_hour
+
+    def consume(self):
+        self._launched.append(time.monotonic())
+        self.stats["launched"] += 1
+
+    def snapshot(self) -> dict:
+        self._trim()
+        return {
+            **self.stats,
+            "used_last_hour": len(self._launched),
+            "max_per_hour": self.max_per_hour,
+        }
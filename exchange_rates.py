@@ -41,8 +41,9 @@ FALLBACK_RATES = {
 
 async def _fetch_rates_from_api() -> Optional[Dict[str, float]]:
     """从免费 API 获取最新汇率（基准 USD）"""
-    import httpx
+    from http_clients import get_http_client
 
+    client = get_http_client("exchange_rates")
     apis = [
         # 主 API: open.er-api.com（完全免费，无限次）
         "https://open.er-api.com/v6/latest/USD",
@@ -52,35 +53,34 @@ async def _fetch_rates_from_api() -> Optional[Dict[str, float]]:
 
     for api_url in apis:
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                resp = await client.get(api_url)
-                if resp.status_code != 200:
-                    continue
-
-                data = resp.json()
-
-                # open.er-api.com 格式
-                if 'rates' in data:
-                    raw_rates = data['rates']
-                    # 转换为 "每单位外币 = ? USD" 的格式
-                    rates = {}
-                    for currency, value in raw_rates.items():
-                        if value and value > 0:
-                            rates[currency.upper()] = 1.0 / value  # 倒数
-                    rates['USD'] = 1.0
-                    logger.info(f"✅ 实时汇率获取成功 (来源: open.er-api.com)")
-                    return rates
-
-                # fawazahmed0 格式
-                elif 'usd' in data:
-                    raw_rates = data['usd']
-                    rates = {}
-                    for currency, value in raw_rates.items():
-                        if value and value > 0:
-                            rates[currency.upper()] = 1.0 / value
-                    rates['USD'] = 1.0
-                    logger.info(f"✅ 实时汇率获取成功 (来源: fawazahmed0)")
-                    return rates
+            resp = await client.get(api_url)
+            if resp.status_code != 200:
+                continue
+
+            data = resp.json()
+
+            # open.er-api.com 格式
+            if 'rates' in data:
+                raw_rates = data['rates']
+                # 转换为 "每单位外币 = ? USD" 的格式
+                rates = {}
+                for currency, value in raw_rates.items():
+                    if value and value > 0:
+                        rates[currency.upper()] = 1.0 / value  # 倒数
+                rates['USD'] = 1.0
+                logger.info(f"✅ 实时汇率获取成功 (来源: open.er-api.com)")
+                return rates
+
+            # fawazahmed0 格式
+            elif 'usd' in data:
+                raw_rates = data['usd']
+                rates = {}
+                for currency, value in raw_rates.items():
+                    if value and value > 0:
+                        rates[currency.upper()] = 1.0 / value
+                rates['USD'] = 1.0
+                logger.info(f"✅ 实时汇率获取成功 (来源: fawazahmed0)")
+                return rates
 
         except Exception as e:
             logger.warning(f"汇率 API 请求失败 ({api_url[:40]}): {e}")
@@ -131,6 +131,18 @@ def get_cached_rate(currency: str) -> float:
     return rates.get(currency.upper(), 1.0)
 
 
+def get_cached_rates() -> Dict[str, float]:
+    """同步获取当前汇率表快照（用于传给解析子进程）"""
+    return dict(_cached_rates or FALLBACK_RATES)
+
+
+def prime_cached_rates(rates: Dict[str, float]):
+    """在子进程中写入主进程传来的汇率表，使同步换算与主进程一致"""
+    global _cached_rates, _cache_timestamp
+    _cached_rates = rates
+    _cache_timestamp = time.time()
+
+
 async def to_usd(price: float, currency: str) -> float:
     """将任意货币转换为美元"""
     rates = await get_exchange_rates()
@@ -0,0 +1,197 @@
+"""
+HTML 解析后端抽象 — 为 Wine-Searcher 页面解析提供统一的节点接口
+后端按速度优先自动选择（可用环境变量 HTML_PARSER 强制指定）：
+  1. selectolax（lexbor 引擎，C 实现，最快）
+  2. lxml + cssselect
+  3. BeautifulSoup html.parser（纯 Python，兜底，始终可用）
+三个后端的文本提取语义与 BeautifulSoup 保持一致：
+  - text() 不含 <script>/<style> 内容
+  - text(strip=True) 逐段去除首尾空白后直接拼接（等同 get_text(strip=True)）
+"""
+import os
+import re
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+HTML_PARSER = os.getenv("HTML_PARSER", "auto").lower()
+
+_SKIP_TEXT_PARENTS = ("script", "style")
+
+
+# ── BeautifulSoup 后端（兜底）──────────────
+class _Bs4Node:
+    __slots__ = ("_el",)
+
+    def __init__(self, el):
+        self._el = el
+
+    def select(self, css: str) -> List["_Bs4Node"]:
+        return [_Bs4Node(el) for el in self._el.select(css)]
+
+    def select_one(self, css: str) -> Optional["_Bs4Node"]:
+        el = self._el.select_one(css)
+        return _Bs4Node(el) if el is not None else None
+
+    def text(self, strip: bool = False) -> str:
+        return self._el.get_text(strip=strip)
+
+    def attr(self, name: str, default: str = "") -> str:
+        value = self._el.get(name)
+        return value if isinstance(value, str) else default
+
+
+class _Bs4Document(_Bs4Node):
+    def strings_matching(self, pattern: re.Pattern) -> List[str]:
+        return [str(s) for s in self._el.find_all(string=pattern)]
+
+
+def _parse_bs4(html: str) -> _Bs4Document:
+    from bs4 import BeautifulSoup
+    return _Bs4Document(BeautifulSoup(html, "html.parser"))
+
+
+# ── lxml 后端 ────────────────────────────
+_LXML_VISIBLE_TEXT = ".//text()[not(parent::script) and not(parent::style)]"
+_lxml_selectors: dict = {}
+
+
+def _lxml_selector(css: str):
+    sel = _lxml_selectors.get(css)
+    if sel is None:
+        from lxml.cssselect import CSSSelector
+        sel = _lxml_selectors[css] = CSSSelector(css, translator="html")
+    return sel
+
+
+class _LxmlNode:
+    __slots__ = ("_el",)
+
+    def __init__(self, el):
+        self._el = el
+
+    def select(self, css: str) -> List["_LxmlNode"]:
+        return [_LxmlNode(el) for el in _lxml_selector(css)(self._el)]
+
+    def select_one(self, css: str) -> Optional["_LxmlNode"]:
+        for el in _lxml_selector(css)(self._el):
+            return _LxmlNode(el)
+        return None
+
+    def text(self, strip: bool = False) -> str:
+        if self._el.tag in _SKIP_TEXT_PARENTS:
+            parts = [self._el.text or ""]
+        else:
+            parts = self._el.xpath(_LXML_VISIBLE_TEXT)
+        if strip:
+            return "".join(p.strip() for p in parts)
+        return "".join(parts)
+
+    def attr(self, name: str, default: str = "") -> str:
+        value = self._el.get(name)
+        return value if value is not None else default
+
+
+class _LxmlDocument(_LxmlNode):
+    def strings_matching(self, pattern: re.Pattern) -> List[str]:
+        return [str(s) for s in self._el.xpath("//text()") if pattern.search(s)]
+
+
+def _parse_lxml(html: str) -> _LxmlDocument:
+    import lxml.html
+    try:
+        root = lxml.html.document_fromstring(html)
+    except ValueError:
+        # 带 XML 编码声明的字符串需以 bytes 形式解析
+        root = lxml.html.document_fromstring(html.encode("utf-8"))
+    return _LxmlDocument(root)
+
+
+# ── selectolax 后端（lexbor）───────────────
+class _LexborNode:
+    __slots__ = ("_el",)
+
+    def __init__(self, el):
+        self._el = el
+
+    def select(self, css: str) -> List["_LexborNode"]:
+        return [_LexborNode(el) for el in self._el.css(css)]
+
+    def select_one(self, css: str) -> Optional["_LexborNode"]:
+        el = self._el.css_first(css)
+        return _LexborNode(el) if el is not None else None
+
+    def text(self, strip: bool = False) -> str:
+        if self._el.tag in _SKIP_TEXT_PARENTS:
+            parts = [self._el.text(deep=True)]
+        else:
+            parts = [
+                n.text_content or "" for n in self._el.traverse(include_text=True)
+                if n.tag == "-text" and n.parent is not None and n.parent.tag not in _SKIP_TEXT_PARENTS
+            ]
+        if strip:
+            return "".join(p.strip() for p in parts)
+        return "".join(parts)
+
+    def attr(self, name: str, default: str = "") -> str:
+        value = self._el.attributes.get(name)
+        return value if value is not None else default
+
+
+class _LexborDocument(_LexborNode):
+    def strings_matching(self, pattern: re.Pattern) -> List[str]:
+        if self._el is None:
+            return []
+        return [
+            n.text_content for n in self._el.traverse(include_text=True)
+            if n.tag == "-text" and n.text_content and pattern.search(n.text_content)
+        ]
+
+
+def _parse_selectolax(html: str) -> _LexborDocument:
+    from selectolax.lexbor import LexborHTMLParser
+    return _LexborDocument(LexborHTMLParser(html).root)
+
+
+# ── 后端选择 ─────────────────────────────
+_BACKENDS = {
+    "selectolax": ("selectolax.lexbor", _parse_selectolax),
+    "lxml": ("lxml.cssselect", _parse_lxml),
+    "bs4": ("bs4", _parse_bs4),
+}
+_AUTO_ORDER = ["selectolax", "lxml", "bs4"]
+
+
+def available_backends() -> List[str]:
+    """当前环境已安装的解析后端（按速度从快到慢）"""
+    names = []
+    for name in _AUTO_ORDER:
+        try:
+            __import__(_BACKENDS[name][0])
+            names.append(name)
+        except ImportError:
+            continue
+    return names
+
+
+def _select_backend() -> str:
+    available = available_backends()
+    if HTML_PARSER != "auto":
+        if HTML_PARSER in available:
+            return HTML_PARSER
+        logger.warning(f"HTML_PARSER={HTML_PARSER} 不可用，改为自动选择")
+    return available[0] if available else "bs4"
+
+
+BACKEND = _select_backend()
+logger.info(f"HTML 解析后端: {BACKEND}")
+
+
+def parse_html(html: str, backend: str = None):
+    """
+    解析 HTML，返回文档节点
+    节点接口: select(css) / select_one(css) / text(strip) / attr(name)
+    文档额外提供: strings_matching(pattern)
+    """
+    return _BACKENDS[backend or BACKEND][1](html)
@@ -0,0 +1,79 @@
+"""
+共享 HTTP 客户端模块 — 按目的地复用 httpx 连接池
+在 main.lifespan 中统一创建、关闭；重复请求直接复用 keep-alive 连接，省去 DNS 解析和 TLS 握手
+未初始化时（单独运行脚本等场景）首次取用会惰性创建
+"""
+import logging
+from typing import Dict
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# ── 各目的地的连接配置 ──────────────────────
+# max_connections: 同时连接上限；max_keepalive_connections: 空闲保活连接数
+_CLIENT_CONFIGS = {
+    # ScraperAPI 代理：单次请求可能长达 90s
+    "scraperapi": {
+        "timeout": 90,
+        "limits": httpx.Limits(max_connections=4, max_keepalive_connections=2, keepalive_expiry=60),
+    },
+    # Wine-Searcher 直连（兜底引擎）
+    "wine-searcher": {
+        "timeout": 30,
+        "follow_redirects": True,
+        "limits": httpx.Limits(max_connections=4, max_keepalive_connections=2, keepalive_expiry=60),
+    },
+    # 汇率 API
+    "exchange_rates": {
+        "timeout": 10,
+        "limits": httpx.Limits(max_connections=2, max_keepalive_connections=2, keepalive_expiry=30),
+    },
+    # Telegram Bot API
+    "telegram": {
+        "timeout": 10,
+        "limits": httpx.Limits(max_connections=4, max_keepalive_connections=2, keepalive_expiry=120),
+    },
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    """HTTP/2 需要可选依赖 h2（pip install httpx[http2]）"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _create_client(name: str) -> httpx.AsyncClient:
+    config = _CLIENT_CONFIGS[name]
+    return httpx.AsyncClient(http2=_http2_available(), **config)
+
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    """获取某个目的地的共享客户端（不要在调用方关闭它）"""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _create_client(name)
+        _clients[name] = client
+    return client
+
+
+async def init_http_clients():
+    """应用启动时创建全部共享客户端"""
+    for name in _CLIENT_CONFIGS:
+        get_http_client(name)
+    logger.info(f"✅ 共享 HTTP 客户端已创建 ({len(_clients)} 个, HTTP/2={'开' if _http2_available() else '关'})")
+
+
+async def close_http_clients():
+    """应用关闭时释放全部连接"""
+    for name, client in list(_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.debug(f"关闭 HTTP 客户端失败 ({name}): {e}")
+    _clients.clear()
@@ -5,6 +5,7 @@ import os
 import sys
 import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
 from datetime import datetime
 
@@ -25,7 +26,10 @@ from database import (
     get_scan_logs, get_price_history, get_stats,
     add_to_watchlist, get_watchlist, remove_from_watchlist
 )
-from scanner import run_full_scan, run_single_scan, is_scanning, get_scan_progress
+from scanner import (
+    run_full_scan, run_single_scan, is_scanning, get_scan_status,
+    request_scan_cancel, join_active_scan,
+)
 from wine_list import PREMIUM_WINES, ALL_WINES
 
 # 日志配置
@@ -41,18 +45,68 @@ _scheduler_task = None
 
 
 async def scheduled_scan():
-    """定时扫描任务"""
+    """定时扫描任务（每轮先加入进行中的任务：其他进程发起的，或上次中断留下的）"""
+    from scan_planner import SCAN_SCHEDULER
+    if SCAN_SCHEDULER == "priority":
+        await _priority_scan_loop()
+    else:
+        await _interval_scan_loop()
+
+
+async def _interval_scan_loop():
+    """
+    固定间隔调度：每个分层按自己的刷新间隔（不超过 SCAN_INTERVAL_MINUTES）扫描，
+    每轮只扫到期的分层（如旗舰每小时、扩展清单每 SCAN_INTERVAL_MINUTES）
+    """
+    from scan_planner import tier_interval_hours
+    from wine_list import SCAN_TIERS
     interval = int(os.getenv("SCAN_INTERVAL_MINUTES", "480"))
     threshold = float(os.getenv("PROFIT_THRESHOLD", "15"))
+    periods = {t["name"]: min(tier_interval_hours(t) * 60, interval) for t in SCAN_TIERS}
+    tick = min(periods.values())
+    last_run: dict = {}
+    logger.info(f"⏰ 固定间隔调度已启动（每 {tick:g} 分钟检查一次到期分层）")
+
+    while True:
+        now = time.monotonic()
+        due = [name for name, minutes in periods.items()
+               if name not in last_run or now - last_run[name] >= minutes * 60]
+        try:
+            logger.info(f"⏰ 定时扫描触发: {', '.join(due)}")
+            if await join_active_scan() is None:
+                result = await run_full_scan(profit_threshold=threshold, notify=True,
+                                             scan_type="interval", tiers=due)
+                if result.get("status") != "skipped":
+                    last_run.update({name: now for name in due})
+        except Exception as e:
+            logger.error(f"定时扫描异常: {e}")
+
+        await asyncio.sleep(tick * 60)
+
+
+async def _priority_scan_loop():
+    """优先级调度：每个 tick 在请求预算内挑选期望收益最高的酒款扫描"""
+    from scan_planner import SCAN_TICK_MINUTES, plan_scan, refund
+    threshold = float(os.getenv("PROFIT_THRESHOLD", "15"))
+    logger.info(f"⏰ 优先级调度已启动（每 {SCAN_TICK_MINUTES:g} 分钟一轮）")
 
     while True:
         try:
-            logger.info(f"⏰ 定时扫描触发（每 {interval} 分钟）")
-            await run_full_scan(profit_threshold=threshold, notify=True)
+            if not is_scanning() and await join_active_scan() is None:
+                wines = await plan_scan(threshold)
+                if wines:
+                    result = await run_full_scan(profit_threshold=threshold, notify=True,
+                                                 wines=wines, scan_type="priority")
+                    if result.get("status") == "skipped":
+                        # 其他扫描抢先开始，本轮一款都没扫：全部退还预算
+                        await refund([w["name"] for w in wines])
+                    else:
+                        # 超出时间预算顺延的酒款下一轮重新排序，先退还预算
+                        await refund(result.get("deferred", []))
         except Exception as e:
             logger.error(f"定时扫描异常: {e}")
 
-        await asyncio.sleep(interval * 60)
+        await asyncio.sleep(SCAN_TICK_MINUTES * 60)
 
 
 @asynccontextmanager
@@ -60,10 +114,34 @@ async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     global _scheduler_task
 
-    # 启动时初始化数据库
+    # 创建共享 HTTP 客户端（连接池在整个应用生命周期内复用）
+    from http_clients import init_http_clients
+    await init_http_clients()
+
+    # 打开数据库连接池（WAL 模式，一写多读），再初始化数据库
+    from database import init_db_pool
+    await init_db_pool()
     await init_db()
+    from database import register_wines
+    from wine_list import WINE_ALIASES
+    await register_wines(ALL_WINES, WINE_ALIASES)
     logger.info("✅ 数据库初始化完成")
 
+    # 恢复扫描跳过缓存（重启后不必重新全量扫描）
+    try:
+        from scanner import load_scan_cache
+        restored = await load_scan_cache()
+        logger.info(f"✅ 已恢复 {restored} 条扫描缓存")
+        from scanner import backfill_scan_cache
+        backfilled = await backfill_scan_cache()
+        if backfilled:
+            logger.info(f"✅ 已按价格历史与机会记录补齐 {backfilled} 款酒的扫描历史")
+        from scanner import load_price_stats
+        restored = await load_price_stats()
+        logger.info(f"✅ 已恢复 {restored} 款酒的价格波动统计")
+    except Exception as e:
+        logger.warning(f"恢复扫描缓存失败: {e}")
+
     # 预热实时汇率缓存
     try:
         from exchange_rates import get_exchange_rates
@@ -74,11 +152,10 @@ async def lifespan(app: FastAPI):
 
     # 清理历史脏数据（利润率异常或价格为零的记录）
     try:
-        from database import get_db
-        db = await get_db()
-        await db.execute("DELETE FROM opportunities WHERE profit_rate > 500 OR buy_price <= 0 OR sell_price_hk <= 0")
-        await db.commit()
-        await db.close()
+        from database import writer
+        async with writer() as db:
+            await db.execute("DELETE FROM opportunities WHERE profit_rate > 500 OR buy_price <= 0 OR sell_price_hk <= 0")
+            await db.commit()
         logger.info("✅ 已清理异常数据")
     except Exception as e:
         logger.warning(f"清理脏数据时出错: {e}")
@@ -89,11 +166,28 @@ async def lifespan(app: FastAPI):
 
     yield
 
-    # 关闭时取消定时任务
+    # 关闭时取消定时任务，并等它收尾（检查点、批量写入、扫描日志）结束，
+    # 再关闭 session、HTTP 客户端、写入队列和连接池，避免收尾写入撞上已关闭的资源
     if _scheduler_task:
         _scheduler_task.cancel()
+        await asyncio.gather(_scheduler_task, return_exceptions=True)
         logger.info("⏹️ 定时扫描任务已停止")
 
+    # 关闭爬虫长连接 session 池
+    from scraper import close_curl_sessions, shutdown_parse_executor
+    await close_curl_sessions()
+    shutdown_parse_executor()
+
+    # 关闭共享 HTTP 客户端
+    from http_clients import close_http_clients
+    await close_http_clients()
+
+    # 写完批量写入缓冲，再关闭数据库连接池
+    from write_behind import close_write_behind
+    await close_write_behind()
+    from database import close_db_pool
+    await close_db_pool()
+
 
 # 创建 FastAPI 应用
 app = FastAPI(
@@ -145,7 +239,7 @@ async def root():
 async def api_stats():
     """获取总览统计数据"""
     stats = await get_stats()
-    stats["scanning"] = is_scanning()
+    stats["scanning"] = (await get_scan_status())["scanning"]
     stats["premium_wines_count"] = len(ALL_WINES)
 
     # 获取实时汇率 (USD -> CNY)
@@ -183,15 +277,20 @@ async def api_opportunity_detail(opp_id: int):
 
 
 @app.post("/api/search")
-async def api_search(req: SearchRequest):
+async def api_search(req: SearchRequest, refresh: bool = Query(False, description="忽略缓存，强制实时抓取")):
     """手动搜索一款酒（复用 analyzer 校验逻辑）"""
 
     result = await run_single_scan(
         wine_name=req.wine_name,
         region=req.region,
         category=req.category,
-        profit_threshold=req.profit_threshold
+        profit_threshold=req.profit_threshold,
+        refresh=refresh,
     )
+    freshness = {
+        "cached": result.get("cached", False),
+        "data_age_seconds": result.get("data_age_seconds", 0),
+    }
 
     gl = result.get("global_lowest") or {}
     opp = result.get("opportunity")  # analyzer 已校验过的结果
@@ -209,6 +308,7 @@ async def api_search(req: SearchRequest):
             "source_merchant": opp.get("buy_merchant", ""),
             "shipping_cost": opp.get("shipping_cost", 0),
             "buy_url": opp.get("buy_url", ""),
+            **freshness,
         }
 
     # analyzer 未通过校验（数据异常或利润率不达标），返回原始数据供参考
@@ -234,13 +334,14 @@ async def api_search(req: SearchRequest):
         "source_merchant": gl.get("merchant", "") if isinstance(gl, dict) else "",
         "shipping_cost": get_shipping_cost(region),
         "buy_url": gl.get("url", "") if isinstance(gl, dict) else "",
+        **freshness,
     }
 
 
 @app.post("/api/scan")
 async def api_trigger_scan(background_tasks: BackgroundTasks):
     """手动触发一次全量扫描"""
-    if is_scanning():
+    if (await get_scan_status())["scanning"]:
         raise HTTPException(status_code=429, detail="扫描已在进行中")
 
     threshold = float(os.getenv("PROFIT_THRESHOLD", "15"))
@@ -248,21 +349,98 @@ async def api_trigger_scan(background_tasks: BackgroundTasks):
     return {"status": "started", "message": "扫描已在后台启动", "total": len(ALL_WINES)}
 
 
+@app.post("/api/scan/cancel")
+async def api_cancel_scan():
+    """取消正在进行的扫描（所有 worker 在途酒款扫完后停止）"""
+    job_id = await request_scan_cancel()
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="当前没有进行中的扫描")
+    return {"status": "cancelling", "job_id": job_id}
+
+
 @app.get("/api/scan/status")
 async def api_scan_status():
-    """获取扫描状态"""
-    progress = get_scan_progress()
+    """获取扫描状态（汇总所有参与扫描的 worker）"""
+    progress = await get_scan_status()
     return {
-        "scanning": is_scanning(),
+        "scanning": progress.get("scanning", False),
         "status": progress.get("status", "idle"),
         "total": progress.get("total", 0),
         "scanned": progress.get("scanned", 0),
         "found": progress.get("found", 0),
         "errors": progress.get("errors", 0),
+        "timed_out": progress.get("timed_out", 0),
         "current_wine": progress.get("current_wine", ""),
+        "in_flight": progress.get("in_flight", []),
+        "concurrency": progress.get("concurrency", 1),
+        "job_id": progress.get("job_id"),
+        "workers": progress.get("workers", []),
     }
 
 
+@app.get("/api/cache/pages")
+async def api_page_cache_stats():
+    """获取原始页面缓存命中统计"""
+    from page_cache import get_cache_stats
+    return get_cache_stats()
+
+
+@app.get("/api/cache/search")
+async def api_search_cache_stats():
+    """获取搜索结果缓存统计"""
+    from result_cache import get_result_cache_stats
+    return get_result_cache_stats()
+
+
+@app.get("/api/db/pool")
+async def api_db_pool_stats():
+    """获取数据库连接池状态（读写次数与等待耗时）"""
+    from database import get_db_pool_stats
+    return get_db_pool_stats()
+
+
+@app.get("/api/db/write-behind")
+async def api_write_behind_stats():
+    """获取扫描结果批量写入状态（待写入条数与持久化延迟）"""
+    from write_behind import get_write_behind_stats
+    return get_write_behind_stats()
+
+
+@app.get("/api/scan/schedule")
+async def api_scan_schedule():
+    """获取优先级调度状态（最近一轮的排序与请求预算）"""
+    from scan_planner import get_scheduler_status
+    return await get_scheduler_status()
+
+
+@app.get("/api/scraper/selectors")
+async def api_selector_stats():
+    """获取 offer 选择器命中率（命中率骤降通常意味着页面改版）"""
+    from scraper import get_selector_stats
+    return get_selector_stats()
+
+
+@app.get("/api/scraper/engines")
+async def api_engine_health():
+    """获取抓取引擎健康状态（成功率、耗时、熔断状态）与对冲请求统计"""
+    from scraper import get_engine_health
+    return get_engine_health()
+
+
+@app.get("/api/scraper/singleflight")
+async def api_singleflight_stats():
+    """获取并发搜索合并统计"""
+    from scraper import get_singleflight_stats
+    return get_singleflight_stats()
+
+
+@app.get("/api/scraper/hk-prefetch")
+async def api_hk_prefetch_stats():
+    """获取 HK 页面并发预抓统计"""
+    from scraper import get_hk_prefetch_stats
+    return get_hk_prefetch_stats()
+
+
 @app.get("/api/logs")
 async def api_scan_logs(limit: int = Query(20, ge=1, le=100)):
     """获取扫描日志"""
@@ -319,24 +497,37 @@ async def api_remove_watchlist(item_id: int):
 
 
 
+@app.post("/api/admin/rebuild-stats")
+async def admin_rebuild_stats():
+    """按全表重新计算首页统计（修正增量维护的偏差）"""
+    from database import rebuild_stats
+    return {"status": "ok", "stats": await rebuild_stats()}
+
+
 @app.get("/api/admin/reset")
 async def admin_reset_db():
     """【紧急修复】手动触发数据库重置，清理旧的错误数据"""
     try:
-        from database import get_db
-        db = await get_db()
-        await db.execute("DELETE FROM opportunities")
-        await db.execute("DELETE FROM price_history")
-        await db.execute("DELETE FROM scan_logs")
-        await db.commit()
-        await db.close()
+        from database import writer
+        async with writer() as db:
+            await db.execute("DELETE FROM opportunities")
+            await db.execute("DELETE FROM price_history")
+            await db.execute("DELETE FROM scan_logs")
+            await db.execute("DELETE FROM scan_cache")
+            await db.execute("DELETE FROM price_stats")
+            await db.execute("DELETE FROM scan_jobs")
+            await db.execute("DELETE FROM scan_job_items")
+            await db.commit()
         
         # 清除内存缓存
         try:
-            from scanner import _scan_cache
+            from scanner import _scan_cache, _price_stats
             _scan_cache.clear()
+            _price_stats.clear()
         except (ImportError, AttributeError):
             pass
+        from result_cache import clear_results
+        clear_results()
             
         logger.warning("⚠️ 数据库已通过 /api/admin/reset 手动清空")
         return {"status": "ok", "message": "数据库已清空，请点击'立即扫描'重新采集数据"}
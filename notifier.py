@@ -3,9 +3,9 @@ Telegram 通知模块
 推送捡漏机会到 Telegram
 """
 import os
-import httpx
 import logging
 from typing import Optional
+from http_clients import get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -112,14 +112,14 @@ async def send_telegram_message(text: str, parse_mode: str = "Markdown") -> bool
     }
 
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.post(url, json=payload)
-            if response.status_code == 200:
-                logger.info("Telegram 通知发送成功")
-                return True
-            else:
-                logger.error(f"Telegram 发送失败: {response.status_code} - {response.text}")
-                return False
+        client = get_http_client("telegram")
+        response = await client.post(url, json=payload)
+        if response.status_code == 200:
+            logger.info("Telegram 通知发送成功")
+            return True
+        else:
+            logger.error(f"Telegram 发送失败: {response.status_code} - {response.text}")
+            return False
     except Exception as e:
         logger.error(f"Telegram 发送异常: {e}")
         return False
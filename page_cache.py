@@ -0,0 +1,224 @@
+"""
+页面缓存模块 — Wine-Searcher 原始 HTML 落盘缓存
+- 内容寻址：正文按 sha256 存储，相同页面只存一份
+- 压缩存储：优先 zstd（需安装 zstandard），否则 gzip
+- 索引按 URL 记录抓取时间，新鲜期内直接返回，不再消耗 ScraperAPI 额度
+- 总大小超限时按最近最少使用（LRU）淘汰
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import Counter, OrderedDict
+from typing import Optional
+
+from database import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# ── 配置 ──────────────────────────────────
+# 默认与数据库放在同一目录（Zeabur 持久化挂载时一并保留）
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", os.path.join(os.path.dirname(DB_PATH), "page_cache"))
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL_MINUTES", "60")) * 60
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_MB", "100")) * 1024 * 1024
+
+try:
+    import zstandard
+    _CODEC = "zst"
+except ImportError:
+    zstandard = None
+    _CODEC = "gz"
+
+_INDEX_FILE = "index.json"
+
+# key=url, value={"digest": str, "codec": str, "fetched_at": float, "size": int}
+# OrderedDict 顺序即 LRU 顺序（末尾为最近使用）
+_index: Optional[OrderedDict] = None
+# 并发扫描时多个 put_page 可能同时保存索引，串行化避免后写入的旧快照覆盖新快照
+_index_lock = asyncio.Lock()
+_stats = {"hits": 0, "misses": 0, "stale": 0, "writes": 0, "evictions": 0}
+
+
+def _blob_path(digest: str, codec: str) -> str:
+    return os.path.join(PAGE_CACHE_DIR, f"{digest}.html.{codec}")
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        if zstandard is None:
+            raise RuntimeError("zstandard 未安装，无法读取 zstd 缓存")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _load_index() -> OrderedDict:
+    global _index
+    if _index is not None:
+        return _index
+    _index = OrderedDict()
+    try:
+        with open(os.path.join(PAGE_CACHE_DIR, _INDEX_FILE), "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        for url, entry in sorted(entries.items(), key=lambda kv: kv[1].get("last_used", 0)):
+            _index[url] = entry
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"页面缓存索引损坏，已重建: {e}")
+    return _index
+
+
+def _write_file(path: str, data: bytes):
+    # 每次写入用独立的临时文件再原子替换：并发写同一路径时不会截断、交错写入同一个文件
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        _remove_file(tmp)
+        raise
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def _save_index():
+    async with _index_lock:
+        # 拿到锁后再取快照，保证最后落盘的是最新的索引
+        snapshot = json.dumps(dict(_load_index()), ensure_ascii=False).encode("utf-8")
+        await asyncio.to_thread(_write_file, os.path.join(PAGE_CACHE_DIR, _INDEX_FILE), snapshot)
+
+
+def _total_size(index: OrderedDict) -> int:
+    blobs = {entry["digest"]: entry["size"] for entry in index.values()}
+    return sum(blobs.values())
+
+
+async def _evict(index: OrderedDict):
+    """按 LRU 淘汰，直到总大小低于上限；不再被引用的正文文件一并删除（总大小与引用计数增量维护）"""
+    total = _total_size(index)
+    if total <= PAGE_CACHE_MAX_BYTES:
+        return
+    refs = Counter(entry["digest"] for entry in index.values())
+    orphans = []
+    while index and total > PAGE_CACHE_MAX_BYTES:
+        url, entry = index.popitem(last=False)
+        _stats["evictions"] += 1
+        refs[entry["digest"]] -= 1
+        if refs[entry["digest"]] == 0:
+            total -= entry["size"]
+            orphans.append(entry)
+        logger.debug(f"页面缓存淘汰: {url[:80]}")
+    # 删除文件期间可能有新页面写入相同正文，删除前按当前索引再确认一次
+    live = {entry["digest"] for entry in index.values()}
+    for entry in orphans:
+        if entry["digest"] not in live:
+            await asyncio.to_thread(_remove_file, _blob_path(entry["digest"], entry["codec"]))
+
+
+async def get_page(url: str, max_age: Optional[float] = None) -> Optional[str]:
+    """
+    读取缓存页面
+    :param max_age: 新鲜期（秒），默认 PAGE_CACHE_TTL；过期视为未命中
+    """
+    index = _load_index()
+    entry = index.get(url)
+    if entry is None:
+        _stats["misses"] += 1
+        return None
+
+    ttl = PAGE_CACHE_TTL if max_age is None else max_age
+    if time.time() - entry["fetched_at"] > ttl:
+        _stats["stale"] += 1
+        return None
+
+    try:
+        raw = await asyncio.to_thread(_read_file, _blob_path(entry["digest"], entry["codec"]))
+        html = _decompress(raw, entry["codec"]).decode("utf-8")
+    except Exception as e:
+        logger.warning(f"页面缓存读取失败，已丢弃: {e}")
+        index.pop(url, None)
+        _stats["misses"] += 1
+        return None
+
+    entry["last_used"] = time.time()
+    index.move_to_end(url)
+    _stats["hits"] += 1
+    return html
+
+
+async def put_page(url: str, html: str):
+    """写入缓存页面（正文按内容哈希去重）"""
+    if not html:
+        return
+    index = _load_index()
+    data = html.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest, _CODEC)
+
+    try:
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+        else:
+            blob = await asyncio.to_thread(_compress, data, _CODEC)
+            await asyncio.to_thread(_write_file, path, blob)
+            size = len(blob)
+    except Exception as e:
+        logger.warning(f"页面缓存写入失败: {e}")
+        return
+
+    now = time.time()
+    old = index.pop(url, None)
+    index[url] = {"digest": digest, "codec": _CODEC, "fetched_at": now, "last_used": now, "size": size}
+    if old and old["digest"] != digest and not any(e["digest"] == old["digest"] for e in index.values()):
+        await asyncio.to_thread(_remove_file, _blob_path(old["digest"], old["codec"]))
+    _stats["writes"] += 1
+
+    await _evict(index)
+    try:
+        await _save_index()
+    except Exception as e:
+        logger.warning(f"页面缓存索引保存失败: {e}")
+
+
+def fetched_at(url: str) -> Optional[float]:
+    """页面的抓取时间（time.time()），没有缓存记录返回 None"""
+    entry = _load_index().get(url)
+    return entry["fetched_at"] if entry else None
+
+
+def get_cache_stats() -> dict:
+    """缓存命中统计"""
+    index = _load_index()
+    lookups = _stats["hits"] + _stats["misses"] + _stats["stale"]
+    return {
+        **_stats,
+        "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else 0,
+        "entries": len(index),
+        "size_bytes": _total_size(index),
+        "max_bytes": PAGE_CACHE_MAX_BYTES,
+        "ttl_seconds": PAGE_CACHE_TTL,
+        "codec": _CODEC,
+    }
@@ -0,0 +1,108 @@
+"""
+价格波动统计 — 每款酒价格序列的滚动漂移与波动率（增量维护）
+每写入一个新价格点，用对数收益按时间间隔归一后更新 EWMA：
+  - drift: 日均对数收益（趋势）
+  - variance: 日方差（波动）
+据此估算价格在 t 天内的预期变动 |μ|·t + σ·√t，
+扫描跳过 TTL 取「预期变动达到 PRICE_TARGET_MOVE 所需时间」，价格不动的酒少扫、剧烈波动的酒多扫
+"""
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+# ── 配置 ──────────────────────────────────
+# 预期价格变动达到该比例时值得重扫（0.03 = 3%）
+PRICE_TARGET_MOVE = float(os.getenv("PRICE_TARGET_MOVE", "0.03"))
+# 自适应 TTL 上下限（小时）
+PRICE_TTL_MIN_HOURS = float(os.getenv("PRICE_TTL_MIN_HOURS", "6"))
+PRICE_TTL_MAX_HOURS = float(os.getenv("PRICE_TTL_MAX_HOURS", "168"))
+
+# EWMA 平滑系数
+_ALPHA = 0.2
+# 至少积累这么多个收益样本才用波动率决定 TTL
+MIN_SAMPLES = 3
+# 相邻样本的最短间隔（天），避免同一小时内的重复记录放大波动
+_MIN_GAP_DAYS = 1 / 24
+
+
+class PriceStats:
+    """单款酒的价格统计"""
+
+    __slots__ = ("last_price", "last_at", "drift", "variance", "samples")
+
+    def __init__(self, last_price: float = None, last_at: datetime = None,
+                 drift: float = 0.0, variance: float = 0.0, samples: int = 0):
+        self.last_price = last_price
+        self.last_at = last_at
+        self.drift = drift
+        self.variance = variance
+        self.samples = samples
+
+    def update(self, price: float, at: datetime):
+        """追加一个价格点（at 为 UTC 时间）"""
+        if price <= 0:
+            return
+        if self.last_price is not None and self.last_at is not None:
+            gap = max((at - self.last_at).total_seconds() / 86400, _MIN_GAP_DAYS)
+            r = math.log(price / self.last_price)
+            if self.samples == 0:
+                self.drift, self.variance = r / gap, r * r / gap
+            else:
+                self.drift = _ALPHA * (r / gap) + (1 - _ALPHA) * self.drift
+                self.variance = _ALPHA * (r * r / gap) + (1 - _ALPHA) * self.variance
+            self.samples += 1
+        self.last_price, self.last_at = price, at
+
+    @property
+    def volatility(self) -> float:
+        """日波动率（对数收益标准差）"""
+        return math.sqrt(self.variance)
+
+    def expected_move(self, days: float) -> float:
+        return abs(self.drift) * days + self.volatility * math.sqrt(days)
+
+    def days_to_move(self, target: float = PRICE_TARGET_MOVE) -> float:
+        """预期变动达到 target 所需天数：解 |μ|·t + σ·√t = target"""
+        mu, sigma = abs(self.drift), self.volatility
+        if mu < 1e-9:
+            return (target / sigma) ** 2 if sigma > 0 else math.inf
+        x = (-sigma + math.sqrt(sigma * sigma + 4 * mu * target)) / (2 * mu)
+        return x * x
+
+    def ttl(self, multiplier: float = 1.0) -> Optional[timedelta]:
+        """波动率决定的跳过 TTL（乘以连续无机会倍数后限制在上下限内）；样本不足返回 None"""
+        if self.samples < MIN_SAMPLES:
+            return None
+        hours = self.days_to_move() * 24 * multiplier
+        hours = min(max(hours, PRICE_TTL_MIN_HOURS), PRICE_TTL_MAX_HOURS)
+        return timedelta(hours=hours)
+
+    def to_row(self) -> dict:
+        return {
+            "last_price": self.last_price,
+            "last_at": self.last_at.isoformat() if self.last_at else None,
+            "drift": self.drift,
+            "variance": self.variance,
+            "samples": self.samples,
+        }
+
+    @classmethod
+    def from_row(cls, row: dict) -> "PriceStats":
+        last_at = None
+        if row.get("last_at"):
+            try:
+                last_at = datetime.fromisoformat(row["last_at"])
+            except ValueError:
+                pass
+        return cls(row.get("last_price"), last_at, row.get("drift") or 0.0,
+                   row.get("variance") or 0.0, row.get("samples") or 0)
+
+    def snapshot(self) -> dict:
+        ttl = self.ttl()
+        return {
+            "samples": self.samples,
+            "daily_drift": round(self.drift, 5),
+            "daily_volatility": round(self.volatility, 5),
+            "ttl_hours": round(ttl.total_seconds() / 3600, 1) if ttl else None,
+        }
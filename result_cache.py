@@ -0,0 +1,70 @@
+"""
+搜索结果缓存 — 按酒名缓存抓取结果（search_wine_basic 的返回值）
+- 定时扫描和手动搜索都会写入，重复搜索直接复用，不再等待实时抓取
+- 只缓存原始抓取数据，利润分析在读取时按请求的地区/阈值重新计算
+- 超过 TTL 视为未命中；条目数超限时按最近最少使用（LRU）淘汰
+"""
+import copy
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from singleflight import normalize_wine_key
+
+# ── 配置 ──────────────────────────────────
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL_MINUTES", "30")) * 60
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "500"))
+
+# key=归一化酒名, value=(写入时间, wine_info)；末尾为最近使用
+_entries: OrderedDict = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "stale": 0, "writes": 0, "evictions": 0}
+
+
+def get_result(wine_name: str, max_age: Optional[float] = None) -> Optional[Tuple[dict, float]]:
+    """
+    读取缓存的抓取结果，返回 (wine_info 副本, 数据年龄秒数)
+    :param max_age: 新鲜期（秒），默认 SEARCH_CACHE_TTL；过期视为未命中
+    """
+    key = normalize_wine_key(wine_name)
+    entry = _entries.get(key)
+    if entry is None:
+        _stats["misses"] += 1
+        return None
+
+    stored_at, wine_info = entry
+    age = time.time() - stored_at
+    if age > (SEARCH_CACHE_TTL if max_age is None else max_age):
+        _stats["stale"] += 1
+        return None
+
+    _entries.move_to_end(key)
+    _stats["hits"] += 1
+    return copy.deepcopy(wine_info), age
+
+
+def put_result(wine_name: str, wine_info: dict):
+    """写入抓取结果"""
+    key = normalize_wine_key(wine_name)
+    _entries.pop(key, None)
+    _entries[key] = (time.time(), copy.deepcopy(wine_info))
+    _stats["writes"] += 1
+    while len(_entries) > SEARCH_CACHE_MAX_ENTRIES:
+        _entries.popitem(last=False)
+        _stats["evictions"] += 1
+
+
+def clear_results():
+    _entries.clear()
+
+
+def get_result_cache_stats() -> dict:
+    """缓存命中统计"""
+    lookups = _stats["hits"] + _stats["misses"] + _stats["stale"]
+    return {
+        **_stats,
+        "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else 0,
+        "entries": len(_entries),
+        "max_entries": SEARCH_CACHE_MAX_ENTRIES,
+        "ttl_seconds": SEARCH_CACHE_TTL,
+    }
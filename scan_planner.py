@@ -0,0 +1,187 @@
+"""
+优先级扫描调度 — 按期望收益决定每轮扫哪些酒
+每款酒的优先级 = 发现机会的概率 × 机会价值 / 预计请求数：
+  - 概率：最近价差（港卖利润率）离阈值多远、价格波动率（price_stats 增量维护）、距上次扫描多久，
+          再与历史命中率（扫描次数/机会次数，平滑后）平均
+  - 价值：最近价差（至少按阈值计）
+  - 成本：1 个全球页面 + 全球页面缺 HK 数据时的 HK 页面，再加摊到每页的 session 预热请求
+热门酒款频繁刷新，冷门酒款很少扫描；
+超过所属分层（wine_list.SCAN_TIERS，如旗舰每小时、扩展清单每天）刷新间隔的酒款到期优先补扫
+所有分层共用一个调度器和每小时请求预算 SCAN_REQUESTS_PER_HOUR（令牌桶），每个 tick 按优先级贪心挑选
+令牌桶存在数据库里，多个 worker 进程共用同一份预算（而不是每个进程各一份，N 个 worker 就是 N 倍）
+"""
+import math
+import os
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from database import consume_request_budget, get_request_budget
+from wine_list import ALL_WINES, SCAN_TIERS, get_scan_tier
+
+logger = logging.getLogger(__name__)
+
+# ── 配置 ──────────────────────────────────
+# priority = 按期望收益调度；interval = 旧的固定间隔全量扫描
+SCAN_SCHEDULER = os.getenv("SCAN_SCHEDULER", "priority").lower()
+SCAN_REQUESTS_PER_HOUR = float(os.getenv("SCAN_REQUESTS_PER_HOUR", "30"))
+SCAN_TICK_MINUTES = float(os.getenv("SCAN_TICK_MINUTES", "20"))
+# 同一款酒两次扫描的最短间隔（分钟）
+SCAN_MIN_RESCAN_MINUTES = float(os.getenv("SCAN_MIN_RESCAN_MINUTES", "60"))
+# 任何分层的刷新间隔上限（小时）；各分层间隔可用 SCAN_TIER_<NAME>_HOURS 覆盖，如 SCAN_TIER_FLAGSHIP_HOURS=2
+SCAN_MAX_STALENESS_HOURS = float(os.getenv("SCAN_MAX_STALENESS_HOURS", "168"))
+
+# 价格样本不足时假设的日波动率（对数收益标准差）
+_DEFAULT_DAILY_VOL = 0.02
+# 从未扫描过的酒款的机会概率（保证新酒款尽快被扫到）
+_UNSCANNED_PROBABILITY = 0.5
+# 命中率先验：相当于 10 次扫描里 1 次机会
+_PRIOR_HITS, _PRIOR_SCANS = 1, 10
+# 距上次扫描的最短计算间隔（天）
+_MIN_SAMPLE_GAP_DAYS = 1 / 24
+
+
+def tier_interval_hours(tier: dict) -> float:
+    """分层的刷新间隔（小时）"""
+    hours = float(os.getenv(f"SCAN_TIER_{tier['name'].upper()}_HOURS", tier["interval_hours"]))
+    return min(hours, SCAN_MAX_STALENESS_HOURS)
+
+
+def _norm_cdf(x: float) -> float:
+    return 0.5 * (1 + math.erf(x / math.sqrt(2)))
+
+
+def opportunity_probability(entry: Optional[dict], daily_vol: float, threshold: float,
+                            now: datetime) -> float:
+    """下次扫描发现机会（利润率 ≥ 阈值）的概率"""
+    if not entry:
+        return _UNSCANNED_PROBABILITY
+    hit_rate = (entry.get("opportunity_hits", 0) + _PRIOR_HITS) / (entry.get("scans", 0) + _PRIOR_SCANS)
+    spread = entry.get("last_profit_rate")
+    if spread is None:
+        return hit_rate
+    # 买入成本变动 x 时利润率约变动 -x·(1+r)，利润率的波动随时间按 √t 放大
+    age_days = max((now - entry["time"]).total_seconds() / 86400, _MIN_SAMPLE_GAP_DAYS)
+    move = daily_vol * math.sqrt(age_days) * (100 + max(spread, -99))
+    p_model = 1 - _norm_cdf((threshold - spread) / max(move, 1e-6))
+    return (p_model + hit_rate) / 2
+
+
+class RequestBudget:
+    """请求预算令牌桶：每小时补充 per_hour 个，最多攒一小时的量（存在数据库里，所有进程共用）"""
+
+    def __init__(self, per_hour: float):
+        self.per_hour = per_hour
+
+    async def available(self) -> float:
+        return await get_request_budget(self.per_hour)
+
+    async def consume(self, amount: float):
+        await consume_request_budget(self.per_hour, amount)
+
+
+_budget = RequestBudget(SCAN_REQUESTS_PER_HOUR)
+_last_plan = {"planned_at": None, "selected": [], "ranking": []}
+
+
+async def rank_wines(threshold: float, now: datetime = None) -> List[dict]:
+    """按优先级从高到低排列全部酒款"""
+    from scanner import _scan_cache, get_price_volatility
+    from scraper import estimate_requests
+
+    now = now or datetime.now()
+    ranking = []
+    for wine in ALL_WINES:
+        name = wine["name"]
+        entry = _scan_cache.get(name)
+        vol = get_price_volatility(name)
+        if vol is None:
+            vol = _DEFAULT_DAILY_VOL
+        probability = opportunity_probability(entry, vol, threshold, now)
+        spread = entry.get("last_profit_rate") if entry else None
+        value = max(spread if spread is not None else threshold, threshold)
+        cost = estimate_requests(name)
+        age_hours = (now - entry["time"]).total_seconds() / 3600 if entry else None
+        tier = get_scan_tier(name, wine.get("category", ""))
+        interval = tier_interval_hours(tier)
+        ranking.append({
+            "wine": wine,
+            "name": name,
+            "tier": tier["name"],
+            "tier_rank": SCAN_TIERS.index(tier),
+            "staleness": age_hours / interval if age_hours is not None else math.inf,
+            "priority": probability * value / cost,
+            "probability": probability,
+            "volatility": vol,
+            "cost": cost,
+            "age_hours": age_hours,
+            "overdue": age_hours is None or age_hours >= interval,
+            "eligible": age_hours is None or age_hours * 60 >= min(SCAN_MIN_RESCAN_MINUTES, interval * 60),
+        })
+    # 到期的排最前（高分层优先，同层越久未扫越靠前），其余按期望收益
+    ranking.sort(key=lambda r: (
+        (0, r["tier_rank"], -r["staleness"]) if r["overdue"] else (1, 0, -r["priority"])
+    ))
+    return ranking
+
+
+async def plan_scan(threshold: float) -> List[dict]:
+    """在当前请求预算内按优先级挑选本轮要扫描的酒款（返回 wine_config 列表）"""
+    from scanner import refresh_shared_state
+    await refresh_shared_state()
+    ranking = await rank_wines(threshold)
+    available = await _budget.available()
+    selected, cost = [], 0.0
+    for item in ranking:
+        if not item["eligible"]:
+            continue
+        if available - cost < item["cost"]:
+            break
+        cost += item["cost"]
+        selected.append(item["wine"])
+    if cost:
+        await _budget.consume(cost)
+
+    _last_plan.update({
+        "planned_at": datetime.now().isoformat(),
+        "selected": [w["name"] for w in selected],
+        "ranking": [
+            {
+                "name": r["name"],
+                "tier": r["tier"],
+                "priority": round(r["priority"], 3),
+                "probability": round(r["probability"], 3),
+                "volatility": round(r["volatility"], 4),
+                "cost": round(r["cost"], 2),
+                "age_hours": round(r["age_hours"], 1) if r["age_hours"] is not None else None,
+                "overdue": r["overdue"],
+            }
+            for r in ranking
+        ],
+    })
+    if selected:
+        logger.info(f"📋 本轮调度 {len(selected)} 款酒 (剩余预算 {available - cost:.1f} 次请求)")
+    return selected
+
+
+async def refund(wine_names: List[str]):
+    """未实际扫描（如超出时间预算被顺延、扫描被跳过）的酒款退还预算"""
+    from scraper import estimate_requests
+    amount = sum(estimate_requests(name) for name in wine_names)
+    if amount:
+        await _budget.consume(-amount)
+
+
+async def get_scheduler_status() -> dict:
+    """调度器状态（最近一次排序结果与预算）"""
+    return {
+        "mode": SCAN_SCHEDULER,
+        "requests_per_hour": SCAN_REQUESTS_PER_HOUR,
+        "tick_minutes": SCAN_TICK_MINUTES,
+        "budget_available": round(await _budget.available(), 2),
+        "tiers": [
+            {"name": t["name"], "label": t["label"], "interval_hours": tier_interval_hours(t)}
+            for t in SCAN_TIERS
+        ],
+        **_last_plan,
+    }
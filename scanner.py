@@ -3,23 +3,61 @@
 自动扫描保值酒清单，发现捡漏机会
 优化策略：
   - 单请求合并：全球+HK 数据一次请求搞定
-  - 自适应缓存：连续无机会的酒 TTL 从 24h→48h→72h 递增
+  - 自适应缓存：跳过 TTL 按价格波动率计算，连续无机会的酒 TTL 成倍延长（样本不足时 24h→48h→72h）
   - curl_cffi 优先：免费引擎优先，ScraperAPI 仅作后备
+  - 并发扫描：多个 worker 并行处理不同酒款，请求频率由按域名限速器统一控制
+  - 批量落库：价格点、机会、扫描缓存经 write_behind 队列攒批，一个事务写入
 """
 import asyncio
 import logging
+import os
 import random
-from datetime import datetime, timedelta
-from wine_list import ALL_WINES
-from scraper import search_wine_basic
+import socket
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from wine_list import ALL_WINES, calculate_profit_rate, get_scan_tier
+from scan_planner import rank_wines, tier_interval_hours
+from scraper import search_wine_basic, estimate_requests, get_fetch_cost_model
+from deadline import Deadline, DeadlineExceeded
+from result_cache import get_result, put_result
 from analyzer import analyze_opportunity
-from database import save_opportunity, save_scan_log, save_price_history, get_stats, get_opportunities
+from write_behind import submit_write, flush_writes
+from database import (
+    save_scan_log, get_stats, get_opportunities,
+    load_scan_cache as db_load_scan_cache, get_scan_cache_backfill,
+    load_price_stats as db_load_price_stats, get_price_series,
+    create_scan_job, claim_scan_job_item, renew_scan_leases, update_scan_job_item, next_scan_lease_expiry,
+    finish_scan_job, request_scan_job_cancel, get_scan_job, get_active_scan_job, get_latest_scan_job,
+    SCAN_MAX_ATTEMPTS,
+)
+from price_stats import PriceStats, MIN_SAMPLES
 from notifier import notify_opportunity, notify_daily_summary
 
 logger = logging.getLogger(__name__)
 
+# 并发扫描 worker 数（1 = 串行）
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", "3"))
+
+# 单款酒抓取总预算（秒）：所有引擎的重试、等待都要在预算内完成
+WINE_DEADLINE_SECONDS = float(os.getenv("WINE_DEADLINE_SECONDS", "120"))
+
+# 单次扫描的时间预算（分钟，0 = 不限）：超出预算的低优先级酒款顺延到下一轮
+SCAN_TIME_BUDGET_MINUTES = float(os.getenv("SCAN_TIME_BUDGET_MINUTES", "0"))
+
+# 中断的扫描任务在多少小时内重启会自动续扫，更早的直接放弃
+SCAN_RESUME_MAX_HOURS = float(os.getenv("SCAN_RESUME_MAX_HOURS", "12"))
+
+# 酒款租约时长（秒）：worker 每 1/3 租约时长续租一次，崩溃后租约过期由其他 worker 接手
+SCAN_LEASE_SECONDS = float(os.getenv("SCAN_LEASE_SECONDS", "60"))
+
+# 本进程的 worker 标识（主机名:pid:随机后缀）
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
 # 扫描状态
 _scan_running = False
+_cancel_event = asyncio.Event()
 _last_scan_result = None
 _scan_progress = {
     "status": "idle",
@@ -28,14 +66,21 @@ _scan_progress = {
     "found": 0,
     "errors": 0,
     "current_wine": "",
+    "in_flight": [],
+    "concurrency": SCAN_CONCURRENCY,
+    "timed_out": 0,
+    "job_id": None,
 }
 
 # ── 自适应缓存：连续无机会次数越多，TTL 越长 ──
 _scan_cache: dict = {}
 # key=wine_name, value={"time": datetime, "had_opportunity": bool, "miss_streak": int}
 
+# 每款酒的价格漂移/波动率统计 {wine_name: PriceStats}
+_price_stats: dict = {}
+
 # 自适应 TTL：连续无机会 0-1 次→24h, 2 次→48h, 3+ 次→72h
-def _get_cache_ttl(miss_streak: int) -> timedelta:
+def _get_streak_ttl(miss_streak: int) -> timedelta:
     if miss_streak <= 1:
         return timedelta(hours=24)
     elif miss_streak == 2:
@@ -44,6 +89,20 @@ def _get_cache_ttl(miss_streak: int) -> timedelta:
         return timedelta(hours=72)
 
 
+def _get_cache_ttl(miss_streak: int, wine_name: str = None) -> timedelta:
+    """
+    跳过 TTL：有足够价格样本时按波动率计算（价格预期变动达到目标所需时间），
+    连续无机会次数作为倍数（1x/2x/3x）；样本不足时沿用 24h/48h/72h
+    """
+    streak_ttl = _get_streak_ttl(miss_streak)
+    stats = _price_stats.get(wine_name) if wine_name else None
+    if stats is not None:
+        ttl = stats.ttl(multiplier=streak_ttl / timedelta(hours=24))
+        if ttl is not None:
+            return ttl
+    return streak_ttl
+
+
 def _should_skip_wine(wine_name: str) -> bool:
     """智能判断是否跳过某款酒"""
     if wine_name not in _scan_cache:
@@ -52,14 +111,195 @@ def _should_skip_wine(wine_name: str) -> bool:
     # 有机会的始终重扫
     if cache.get("had_opportunity"):
         return False
-    # 根据连续无机会次数决定 TTL
-    ttl = _get_cache_ttl(cache.get("miss_streak", 0))
+    # 根据连续无机会次数决定 TTL，不超过所属分层的刷新间隔
+    ttl = _get_cache_ttl(cache.get("miss_streak", 0), wine_name)
+    ttl = min(ttl, timedelta(hours=tier_interval_hours(get_scan_tier(wine_name))))
     if datetime.now() - cache["time"] < ttl:
         return True
     return False
 
 
+def _update_scan_cache(wine_name: str, had_opportunity: bool, profit_rate: float = None):
+    """
+    更新扫描缓存并排队落库（有机会清零连续无机会计数，否则加一）
+    同时累计扫描次数、命中次数和最近一次港卖价差（利润率），供优先级调度使用
+    """
+    prev = _scan_cache.get(wine_name, {})
+    entry = {
+        "time": datetime.now(),
+        "had_opportunity": had_opportunity,
+        "miss_streak": 0 if had_opportunity else prev.get("miss_streak", 0) + 1,
+        "scans": prev.get("scans", 0) + 1,
+        "opportunity_hits": prev.get("opportunity_hits", 0) + int(had_opportunity),
+        "last_profit_rate": profit_rate if profit_rate is not None else prev.get("last_profit_rate"),
+    }
+    _scan_cache[wine_name] = entry
+    # 落库失败由队列记录日志，内存缓存照常生效
+    submit_write(
+        "scan_cache", wine_name=wine_name, scanned_at=entry["time"], had_opportunity=had_opportunity,
+        miss_streak=entry["miss_streak"], scans=entry["scans"],
+        opportunity_hits=entry["opportunity_hits"], last_profit_rate=entry["last_profit_rate"],
+    )
+
+
+async def load_scan_cache() -> int:
+    """从数据库恢复扫描缓存（启动时，及每轮调度前同步其他进程的扫描结果），返回条目数"""
+    rows = await db_load_scan_cache()
+    for row in rows:
+        try:
+            scanned_at = datetime.fromisoformat(row["scanned_at"])
+        except (TypeError, ValueError):
+            continue
+        _scan_cache[row["wine_name"]] = {
+            "time": scanned_at,
+            "had_opportunity": bool(row["had_opportunity"]),
+            "miss_streak": row["miss_streak"] or 0,
+            "scans": row["scans"] or 0,
+            "opportunity_hits": row["opportunity_hits"] or 0,
+            "last_profit_rate": row["last_profit_rate"],
+        }
+    return len(_scan_cache)
+
+
+async def backfill_scan_cache() -> int:
+    """
+    启动时为没有扫描缓存的酒款（旧库升级）按价格历史与机会记录补齐扫描次数、命中次数和最近价差，
+    优先级调度不必让所有酒从同一个先验起步、忽略过去的赢家；返回补齐的条目数
+    """
+    count = 0
+    for row in await get_scan_cache_backfill():
+        try:
+            # 数据库时间为 UTC，扫描缓存用本地时间
+            last_at = datetime.fromisoformat(row["last_at"]).replace(tzinfo=timezone.utc)
+            scanned_at = last_at.astimezone().replace(tzinfo=None)
+        except (TypeError, ValueError):
+            continue
+        entry = {
+            "time": scanned_at,
+            "had_opportunity": bool(row["active"]),
+            "miss_streak": row["miss_streak"],
+            "scans": row["scans"],
+            "opportunity_hits": row["opportunity_hits"],
+            "last_profit_rate": row["last_profit_rate"],
+        }
+        _scan_cache[row["wine_name"]] = entry
+        submit_write(
+            "scan_cache", wine_name=row["wine_name"], scanned_at=scanned_at,
+            had_opportunity=entry["had_opportunity"], miss_streak=entry["miss_streak"],
+            scans=entry["scans"], opportunity_hits=entry["opportunity_hits"],
+            last_profit_rate=entry["last_profit_rate"],
+        )
+        count += 1
+    await flush_writes()
+    return count
+
+
+def _utcnow() -> datetime:
+    # 与 price_history.recorded_at（SQLite CURRENT_TIMESTAMP）同为 UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _page_time(fetched_at: float = None) -> datetime:
+    """价格点的时间：页面抓取时间（time.time()，没有时取当前时间），UTC，精确到秒（与 recorded_at 一致）"""
+    at = datetime.fromtimestamp(fetched_at, timezone.utc).replace(tzinfo=None) if fetched_at else _utcnow()
+    return at.replace(microsecond=0)
+
+
+def _update_price_stats(wine_name: str, price: float, at: datetime):
+    """
+    新价格点写入后增量更新漂移/波动率并排队落库
+    at: 价格点时间（页面抓取时间）；不晚于上一个样本时说明是同一份缓存页面，
+    不作为新样本计入，否则相同价格会被当成「价格没变」反复压低波动率
+    """
+    stats = _price_stats.setdefault(wine_name, PriceStats())
+    if stats.last_at is not None and at <= stats.last_at:
+        logger.debug(f"价格来自已计入的缓存页面，跳过统计更新: {wine_name}")
+        return
+    stats.update(price, at)
+    submit_write("price_stats", wine_name=wine_name, stats=stats.to_row())
+
+
+async def _reload_price_stats():
+    for row in await db_load_price_stats():
+        _price_stats[row["wine_name"]] = PriceStats.from_row(row)
+
+
+async def refresh_shared_state():
+    """
+    每轮调度前从数据库重新载入扫描缓存与价格统计：多个 worker 进程时，
+    其他进程刚扫过的酒款在这里也会被跳过/降权，不会重复扫描、重复消耗共享的请求预算
+    先写完本进程缓冲中的写入，避免数据库里的旧值覆盖刚更新的内存条目
+    """
+    await flush_writes()
+    await load_scan_cache()
+    await _reload_price_stats()
+
+
+async def load_price_stats() -> int:
+    """
+    启动时恢复价格统计；旧库中没有统计记录的酒款，用已有价格历史回放一次补齐
+    返回恢复的条目数
+    """
+    await _reload_price_stats()
+
+    # 只回放缺统计记录的酒款，已有统计的酒不必在启动时读全部价格历史
+    series = await get_price_series(without_stats=True)
+    for wine_name, points in series.items():
+        stats = PriceStats()
+        for recorded_at, price in points:
+            try:
+                stats.update(price, datetime.fromisoformat(recorded_at))
+            except (TypeError, ValueError):
+                continue
+        _price_stats[wine_name] = stats
+        submit_write("price_stats", wine_name=wine_name, stats=stats.to_row())
+    await flush_writes()
+    return len(_price_stats)
+
+
+def get_price_volatility(wine_name: str):
+    """日波动率；价格样本不足时返回 None"""
+    stats = _price_stats.get(wine_name)
+    if stats is None or stats.samples < MIN_SAMPLES:
+        return None
+    return stats.volatility
+
+
+def _fit_time_budget(candidates: list, budget_seconds: float, concurrency: int) -> tuple:
+    """
+    按优先级顺序挑选预计能在时间预算内扫完的酒款，返回 (本轮扫描, 顺延)
+    预计耗时取两者较大值（请求总数含摊销的 session 预热请求）：
+      - 请求总数 × 单次请求耗时 / 实际并行度（并发数与同域名在途上限取小）
+      - 请求总数 × 同域名平均请求间隔（最小间隔 × 抖动均值）
+    """
+    model = get_fetch_cost_model()
+    parallel = max(1, min(concurrency, model["max_in_flight"]))
+    requests = 0.0
+    selected, deferred = [], []
+    for wine in candidates:
+        total = requests + estimate_requests(wine["name"])
+        estimate = max(total * model["request_seconds"] / parallel, total * model["min_interval"])
+        if estimate <= budget_seconds:
+            selected.append(wine)
+            requests = total
+        else:
+            deferred.append(wine)
+    return selected, deferred
+
+
+def _observed_profit_rate(wine_info: dict, wine_config: dict):
+    """未达阈值时的实际价差（利润率），数据缺失或明显异常时返回 None"""
+    gl = wine_info.get("global_lowest") or {}
+    buy_price = gl.get("price_usd") or 0
+    hk_avg = wine_info.get("hk_avg_price_usd") or 0
+    if buy_price <= 0 or hk_avg <= 0:
+        return None
+    rate = calculate_profit_rate(buy_price, hk_avg, wine_config.get("region", "default"), is_case=True)
+    return rate if -100 < rate <= 500 else None
+
+
 def is_scanning() -> bool:
+    """本进程是否正在参与扫描（全部进程的汇总状态见 get_scan_status）"""
     return _scan_running
 
 
@@ -71,173 +311,401 @@ def get_last_scan_result():
     return _last_scan_result
 
 
-async def run_full_scan(profit_threshold: float = 15, notify: bool = True) -> dict:
+def _job_progress(job: dict) -> dict:
+    """由任务各酒款的检查点汇总进度（覆盖所有参与的 worker）"""
+    items = job["items"]
+    now = time.time()
+    counts = Counter(i["status"] for i in items)
+    leased = [i for i in items if i["status"] == "leased" and (i["lease_expires_at"] or 0) >= now]
+    status = job["status"]
+    if status == "running" and job.get("cancel_requested"):
+        status = "cancelling"
+    return {
+        "job_id": job["id"],
+        "status": status,
+        "scanning": job["status"] == "running",
+        "total": len(items) + (job.get("skipped") or 0),
+        "scanned": counts["done"] + counts["timed_out"] + counts["skipped"] + (job.get("skipped") or 0),
+        "found": sum(1 for i in items if i["opportunity"]),
+        "errors": counts["error"],
+        "timed_out": counts["timed_out"],
+        "in_flight": [i["wine_name"] for i in leased],
+        "current_wine": leased[-1]["wine_name"] if leased else "",
+        "workers": sorted({i["lease_owner"] for i in leased}),
+    }
+
+
+async def get_scan_status() -> dict:
+    """最近一次扫描任务的汇总进度（多进程时也一致）；数据库不可用时退回本进程状态"""
+    try:
+        job = await get_latest_scan_job()
+    except Exception as e:
+        logger.warning(f"读取扫描任务失败: {e}")
+        job = None
+    if job is None:
+        return {**_scan_progress, "scanning": _scan_running, "workers": []}
+    return {**_job_progress(job), "concurrency": _scan_progress["concurrency"]}
+
+
+async def run_full_scan(profit_threshold: float = 15, notify: bool = True,
+                        concurrency: int = None, wines: list = None,
+                        scan_type: str = "full", time_budget_seconds: float = None,
+                        resume_job: dict = None, tiers: list = None) -> dict:
     """
     执行一次完整扫描
     遍历保值酒清单 → 爬取价格 → 分析利润 → 保存+通知
     智能缓存: 24h 内无机会的酒款自动跳过
+    并发扫描: concurrency 个 worker 同时处理不同酒款，对目标站的请求频率由 scraper 的按域名限速器控制
+    wines: 指定要扫描的酒款（按给定顺序，不受跳过缓存限制），由优先级调度器选出；默认扫描全部清单
+    time_budget_seconds: 时间预算（默认 SCAN_TIME_BUDGET_MINUTES），按最近请求耗时估算，
+                         只扫优先级最高、预计能按时完成的酒款，其余记入扫描日志的 deferred 顺延到下一轮
+    resume_job: 加入已有的扫描任务（其他进程发起的，或上次中断的），只领取尚未完成的酒款
+    tiers: 只扫描这些分层（名称列表）的酒款，供固定间隔调度按分层刷新；默认全部分层
+    扫描任务存在数据库中，酒款按租约领取，多个进程可以分担同一个任务
     """
-    global _scan_running, _last_scan_result
+    global _scan_running
 
     if _scan_running:
         logger.warning("扫描已在进行中，跳过本次")
         return {"status": "skipped", "reason": "scan_in_progress"}
 
-    # 预热汇率缓存
-    try:
-        from exchange_rates import get_exchange_rates
-        await get_exchange_rates()
-    except Exception:
-        pass
+    if concurrency is None:
+        concurrency = SCAN_CONCURRENCY
+    concurrency = max(1, concurrency)
+    if time_budget_seconds is None:
+        time_budget_seconds = SCAN_TIME_BUDGET_MINUTES * 60
 
     _scan_running = True
-    started_at = datetime.now()
-    wines_scanned = 0
-    opportunities_found = 0
-    skipped = 0
-    errors = []
-    found_opportunities = []
+    _cancel_event.clear()
+    try:
+        # 预热汇率缓存
+        try:
+            from exchange_rates import get_exchange_rates
+            await get_exchange_rates()
+        except Exception:
+            pass
+
+        if resume_job:
+            return await _execute_scan(resume_job, notify=bool(resume_job["notify"]), concurrency=concurrency)
+
+        skipped = 0
+        if wines is not None:
+            wines_to_scan = list(wines)
+        else:
+            # 随机打乱顺序，避免每次扫描模式相同触发反爬；跳过缓存内的酒款不进入任务
+            await refresh_shared_state()
+            candidates = ALL_WINES if tiers is None else [
+                w for w in ALL_WINES if get_scan_tier(w["name"], w.get("category", ""))["name"] in tiers
+            ]
+            wines_to_scan = [w for w in candidates if not _should_skip_wine(w["name"])]
+            skipped = len(candidates) - len(wines_to_scan)
+            random.shuffle(wines_to_scan)
+
+        deferred = []
+        if time_budget_seconds:
+            if wines is None:
+                # 按调度优先级排序后再挑选
+                order = {r["name"]: i for i, r in enumerate(await rank_wines(profit_threshold))}
+                wines_to_scan.sort(key=lambda w: order.get(w["name"], len(order)))
+            wines_to_scan, deferred = _fit_time_budget(wines_to_scan, time_budget_seconds, concurrency)
+            if deferred:
+                logger.info(
+                    f"⏳ 时间预算 {time_budget_seconds / 60:.0f} 分钟: 本轮扫描 {len(wines_to_scan)} 款, "
+                    f"顺延 {len(deferred)} 款"
+                )
+
+        job_id = await create_scan_job({
+            "scan_type": scan_type,
+            "profit_threshold": profit_threshold,
+            "notify": notify,
+            "concurrency": concurrency,
+            "skipped": skipped,
+            "deferred": "; ".join(w["name"] for w in deferred) if deferred else None,
+            "started_at": datetime.now().isoformat(),
+        }, wines_to_scan)
+        if job_id is None:
+            logger.warning("其他进程的扫描任务正在进行，跳过本次")
+            return {"status": "skipped", "reason": "scan_in_progress"}
+        return await _execute_scan(await get_scan_job(job_id), notify=notify, concurrency=concurrency)
+    finally:
+        _scan_running = False
+        if _scan_progress["status"] in ("running", "cancelling"):
+            _scan_progress["status"] = "completed_with_errors"
+        _scan_progress["current_wine"] = ""
+        _scan_progress["in_flight"] = []
+
 
-    # 随机打乱顺序，避免每次扫描模式相同触发反爬
-    wines_to_scan = list(ALL_WINES)
-    random.shuffle(wines_to_scan)
-    total = len(wines_to_scan)
+async def _execute_scan(job: dict, notify: bool, concurrency: int) -> dict:
+    """领取任务中的酒款逐款扫描，直到没有可领取的；最后一个完成的 worker 写扫描日志"""
+    global _last_scan_result
 
+    job_id = job["id"]
+    profit_threshold = job["profit_threshold"]
+    started_at = datetime.fromisoformat(job["started_at"])
+    found_opportunities = []
+    in_flight: list = []
+    claimed = 0
+
+    # 计数从任务检查点起算（加入进行中的任务时包含其他 worker 已完成的部分），之后随本 worker 的检查点累加
+    initial = _job_progress(job)
     _scan_progress.update({
         "status": "running",
-        "total": total,
-        "scanned": 0,
-        "found": 0,
-        "errors": 0,
+        "job_id": job_id,
+        "total": initial["total"],
+        "scanned": initial["scanned"],
+        "found": initial["found"],
+        "errors": initial["errors"],
+        "timed_out": initial["timed_out"],
         "current_wine": "",
+        "in_flight": [],
+        "concurrency": concurrency,
     })
 
-    logger.info(f"🔍 开始扫描 {total} 款保值酒...")
-
-    try:
-        for wine_config in wines_to_scan:
-            wine_name = wine_config["name"]
-            _scan_progress["current_wine"] = wine_name
-
-            # ── 智能缓存检查 ──
-            if _should_skip_wine(wine_name):
-                skipped += 1
-                _scan_progress["scanned"] = wines_scanned + skipped
-                logger.debug(f"⏭️ 跳过 (24h缓存): {wine_name}")
-                continue
-
-            try:
-                # 1. 爬取价格数据
-                wine_info = await search_wine_basic(wine_name)
-                wines_scanned += 1
-                _scan_progress["scanned"] = wines_scanned + skipped
-
-                if not wine_info.get("found"):
-                    # 记录缓存：没找到数据，增加连续无机会计数
-                    prev = _scan_cache.get(wine_name, {})
-                    _scan_cache[wine_name] = {
-                        "time": datetime.now(),
-                        "had_opportunity": False,
-                        "miss_streak": prev.get("miss_streak", 0) + 1
-                    }
-                    logger.debug(f"未找到数据: {wine_name}")
-                    continue
-
-                # 2. 保存价格历史
-                if wine_info.get("global_lowest"):
-                    gl = wine_info["global_lowest"]
-                    await save_price_history(
-                        wine_name=wine_name,
-                        vintage="",
-                        price=gl["price_usd"],
-                        currency="USD",
-                        source="wine-searcher",
-                        merchant=gl.get("merchant", ""),
-                        country=gl.get("country", "")
-                    )
-
-                # 3. 分析是否为捡漏机会
-                opp = analyze_opportunity(wine_info, wine_config, profit_threshold)
-                if opp:
-                    # 确保 buy_url 指向 Wine-Searcher 搜索页
-                    buy_url = opp.get("buy_url", "")
-                    if not buy_url or ('wine-searcher.com' not in buy_url):
-                        ws_query = wine_name.replace(' ', '+')
-                        opp["buy_url"] = f"https://www.wine-searcher.com/find/{ws_query}/1/a"
-
-                    # 保存到数据库
-                    opp_id = await save_opportunity(opp)
-                    opp["id"] = opp_id
-                    found_opportunities.append(opp)
-                    opportunities_found += 1
-                    _scan_progress["found"] = opportunities_found
-
-                    # 记录缓存：有机会，重置连续无机会计数
-                    _scan_cache[wine_name] = {
-                        "time": datetime.now(),
-                        "had_opportunity": True,
-                        "miss_streak": 0
-                    }
-
-                    # 发送 Telegram 通知
-                    if notify:
-                        await notify_opportunity(opp)
-                else:
-                    # 记录缓存：无机会，增加连续无机会计数
-                    prev = _scan_cache.get(wine_name, {})
-                    _scan_cache[wine_name] = {
-                        "time": datetime.now(),
-                        "had_opportunity": False,
-                        "miss_streak": prev.get("miss_streak", 0) + 1
-                    }
-
-            except Exception as e:
-                error_msg = f"{wine_name}: {str(e)}"
-                errors.append(error_msg)
-                _scan_progress["errors"] = len(errors)
-                logger.error(f"扫描异常: {error_msg}")
+    done = sum(1 for i in job["items"] if i["status"] not in ("pending", "leased"))
+    if done:
+        logger.info(f"🔁 加入扫描任务 #{job_id}: 已完成 {done}/{len(job['items'])} 款")
+    logger.info(f"🔍 开始扫描 {_scan_progress['total']} 款保值酒 (并发 {concurrency}, worker {WORKER_ID})...")
+
+    async def scan_wine(item: dict):
+        wine_name = item["wine_name"]
+        wine_config = {"name": wine_name, "region": item["region"], "category": item["category"]}
+        status, had_opportunity, error = "done", False, None
+
+        in_flight.append(wine_name)
+        _scan_progress["in_flight"] = list(in_flight)
+        _scan_progress["current_wine"] = wine_name
+        try:
+            # 1. 爬取价格数据（预算内未完成记为超时；wait_for 兜底非协作的阻塞）
+            deadline = Deadline(WINE_DEADLINE_SECONDS)
+            wine_info = await asyncio.wait_for(
+                search_wine_basic(wine_name, deadline=deadline),
+                timeout=WINE_DEADLINE_SECONDS + 5,
+            )
+            put_result(wine_name, wine_info)
+
+            if not wine_info.get("found"):
+                # 记录缓存：没找到数据，增加连续无机会计数
+                _update_scan_cache(wine_name, had_opportunity=False)
+                logger.debug(f"未找到数据: {wine_name}")
+                return
+
+            # 2. 保存价格历史
+            if wine_info.get("global_lowest"):
+                gl = wine_info["global_lowest"]
+                # 价格点按页面抓取时间记录：页面缓存命中时与上次扫描是同一个点，不重复写入
+                recorded_at = _page_time(wine_info.get("fetched_at"))
+                submit_write(
+                    "price_history",
+                    wine_name=wine_name,
+                    vintage="",
+                    price=gl["price_usd"],
+                    currency="USD",
+                    source="wine-searcher",
+                    merchant=gl.get("merchant", ""),
+                    country=gl.get("country", ""),
+                    recorded_at=recorded_at.strftime("%Y-%m-%d %H:%M:%S"),
+                )
+                _update_price_stats(wine_name, gl["price_usd"], recorded_at)
+
+            # 3. 分析是否为捡漏机会
+            opp = analyze_opportunity(wine_info, wine_config, profit_threshold)
+            if opp:
+                # 确保 buy_url 指向 Wine-Searcher 搜索页
+                buy_url = opp.get("buy_url", "")
+                if not buy_url or ('wine-searcher.com' not in buy_url):
+                    ws_query = wine_name.replace(' ', '+')
+                    opp["buy_url"] = f"https://www.wine-searcher.com/find/{ws_query}/1/a"
+
+                # 排队保存到数据库，落库后回填 id
+                submit_write("opportunity", opp=opp).add_done_callback(
+                    lambda future, opp=opp: _fill_opportunity_id(opp, future)
+                )
+                found_opportunities.append(opp)
+                had_opportunity = True
+
+                # 记录缓存：有机会，重置连续无机会计数
+                _update_scan_cache(wine_name, had_opportunity=True, profit_rate=opp.get("profit_rate"))
+
+                # 发送 Telegram 通知
+                if notify:
+                    await notify_opportunity(opp)
+            else:
+                # 记录缓存：无机会，增加连续无机会计数
+                _update_scan_cache(
+                    wine_name, had_opportunity=False,
+                    profit_rate=_observed_profit_rate(wine_info, wine_config),
+                )
+
+        except (DeadlineExceeded, asyncio.TimeoutError):
+            status = "timed_out"
+            logger.warning(f"⏰ 抓取超时 (>{WINE_DEADLINE_SECONDS:.0f}s): {wine_name}")
+        except asyncio.CancelledError:
+            # 进程退出时被强制取消：不写检查点，租约过期后由其他 worker 重新领取
+            status = None
+            raise
+        except Exception as e:
+            status, error = "error", str(e)
+            logger.error(f"扫描异常: {wine_name}: {str(e)}")
+        finally:
+            if wine_name in in_flight:
+                in_flight.remove(wine_name)
+            _scan_progress["in_flight"] = list(in_flight)
+            _scan_progress["current_wine"] = in_flight[-1] if in_flight else ""
+            if status:
+                _scan_progress["scanned"] += int(status != "error")
+                _scan_progress["found"] += int(had_opportunity)
+                _scan_progress["errors"] += int(status == "error")
+                _scan_progress["timed_out"] += int(status == "timed_out")
+                await _checkpoint(job_id, wine_name, status, had_opportunity, error)
+
+    async def worker():
+        nonlocal claimed
+        while True:
+            item = None
+            if not _cancel_event.is_set():
+                item = await claim_scan_job_item(job_id, WORKER_ID, SCAN_LEASE_SECONDS, SCAN_MAX_ATTEMPTS)
+            if item is not None:
+                claimed += 1
+                await scan_wine(item)
                 continue
-
-        # 保存扫描日志
-        duration = (datetime.now() - started_at).total_seconds()
+            # 没有可领取的酒款，但其他 worker（可能已崩溃）仍持有租约：等到最早的租约到期再尝试接手，
+            # 所有租约都结束后才退出，任务由此收尾，不会一直停在 running 挡住新扫描
+            expires_at = await next_scan_lease_expiry(job_id)
+            if expires_at is None:
+                return
+            await asyncio.sleep(min(max(expires_at - time.time(), 0) + 0.5, SCAN_LEASE_SECONDS / 3))
+
+    heartbeat = asyncio.create_task(_renew_leases(job_id))
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        heartbeat.cancel()
+        # 结束任务、写日志前确保本轮结果已落库（同时回填机会 id）
+        await flush_writes()
+
+    # 没有可领取的酒款了：其他 worker 仍在扫描时由最后完成的一方结束任务并写日志
+    finished = await finish_scan_job(job_id)
+    job = await get_scan_job(job_id)
+    progress = _job_progress(job)
+    # 结束时以任务汇总为准（包含其他 worker 扫完的酒款）
+    _scan_progress.update({k: progress[k] for k in ("total", "scanned", "found", "errors", "timed_out")})
+    items = job["items"]
+    errors = [f"{i['wine_name']}: {i['error']}" for i in items if i["status"] == "error"]
+    timed_out = [i["wine_name"] for i in items if i["status"] == "timed_out"]
+    deferred = job["deferred"].split("; ") if job.get("deferred") else []
+    wines_scanned = sum(1 for i in items if i["status"] in ("done", "timed_out"))
+    wines_skipped = progress["scanned"] - wines_scanned
+    duration = (datetime.now() - started_at).total_seconds()
+
+    if finished:
         await save_scan_log({
-            "scan_type": "full",
+            "scan_type": job["scan_type"] if job["status"] != "cancelled" else f"{job['scan_type']} (cancelled)",
             "wines_scanned": wines_scanned,
-            "opportunities_found": opportunities_found,
+            "opportunities_found": progress["found"],
             "errors": "; ".join(errors) if errors else None,
+            "timed_out": "; ".join(timed_out) if timed_out else None,
+            "deferred": "; ".join(deferred) if deferred else None,
             "started_at": started_at.isoformat(),
             "duration_seconds": duration,
         })
 
-        result = {
-            "status": "completed",
-            "wines_scanned": wines_scanned,
-            "wines_skipped": skipped,
-            "opportunities_found": opportunities_found,
-            "errors_count": len(errors),
-            "duration_seconds": round(duration, 1),
-            "opportunities": found_opportunities,
-        }
+    result = {
+        "status": job["status"],
+        "job_id": job_id,
+        "wines_scanned": wines_scanned,
+        "wines_skipped": wines_skipped,
+        "wines_claimed": claimed,
+        "opportunities_found": progress["found"],
+        "errors_count": len(errors),
+        "timed_out": timed_out,
+        "deferred": deferred,
+        "duration_seconds": round(duration, 1),
+        "concurrency": concurrency,
+        "opportunities": found_opportunities,
+    }
+    _last_scan_result = result
 
-        _last_scan_result = result
+    if job["status"] == "cancelled":
+        logger.warning(f"⏹️ 扫描任务 #{job_id} 已取消: 完成 {wines_scanned} 款")
+    elif job["status"] == "running":
+        logger.info(f"✅ 本 worker 已无可领取的酒款 (扫描 {claimed} 款)，任务 #{job_id} 由其他 worker 收尾")
+    else:
         logger.info(
-            f"✅ 扫描完成: {wines_scanned} 款酒 (跳过 {skipped} 款), "
-            f"发现 {opportunities_found} 条机会, "
+            f"✅ 扫描完成: {wines_scanned} 款酒 (跳过 {wines_skipped} 款), "
+            f"发现 {progress['found']} 条机会, "
             f"耗时 {duration:.1f}s"
         )
+    if job["status"] == "cancelled":
+        _scan_progress["status"] = "cancelled"
+    else:
+        _scan_progress["status"] = "completed" if not errors else "completed_with_errors"
+    return result
 
-        return result
 
-    finally:
-        _scan_running = False
-        _scan_progress["status"] = "completed" if not errors else "completed_with_errors"
-        _scan_progress["current_wine"] = ""
+def _fill_opportunity_id(opp: dict, future: asyncio.Future):
+    if not future.cancelled() and future.exception() is None:
+        opp["id"] = future.result()
+
+
+async def _renew_leases(job_id: int):
+    """心跳：定期续租本 worker 正在扫描的酒款"""
+    while True:
+        await asyncio.sleep(SCAN_LEASE_SECONDS / 3)
+        try:
+            await renew_scan_leases(job_id, WORKER_ID, SCAN_LEASE_SECONDS)
+        except Exception as e:
+            logger.warning(f"扫描租约续租失败: {e}")
+
+
+async def _checkpoint(job_id: int, wine_name: str, status: str,
+                      opportunity: bool = False, error: str = None):
+    try:
+        if not await update_scan_job_item(job_id, wine_name, status, WORKER_ID, opportunity, error):
+            logger.warning(f"扫描租约已失效，结果由其他 worker 负责: {wine_name}")
+    except Exception as e:
+        logger.warning(f"扫描检查点写入失败: {wine_name}: {e}")
+
+
+async def request_scan_cancel():
+    """
+    请求取消进行中的扫描任务，返回任务 id（没有进行中的任务返回 None）
+    所有 worker 不再领取新酒款，在途酒款扫完后停止；未扫酒款不再续扫
+    """
+    job = await get_active_scan_job()
+    if not job:
+        return None
+    await request_scan_job_cancel(job["id"])
+    _cancel_event.set()
+    if _scan_running:
+        _scan_progress["status"] = "cancelling"
+    logger.info(f"⏹️ 已请求取消扫描任务 #{job['id']}")
+    return job["id"]
+
+
+async def join_active_scan():
+    """
+    加入进行中的扫描任务（其他进程发起的，或上次进程中断留下的）
+    超过 SCAN_RESUME_MAX_HOURS 的任务直接放弃；没有可加入的任务返回 None
+    """
+    if _scan_running:
+        return None
+    job = await get_active_scan_job()
+    if not job:
+        return None
+    age_hours = (datetime.now() - datetime.fromisoformat(job["started_at"])).total_seconds() / 3600
+    if age_hours > SCAN_RESUME_MAX_HOURS:
+        await finish_scan_job(job["id"], "abandoned")
+        logger.info(f"放弃过期的扫描任务 #{job['id']} ({age_hours:.0f}h 前)")
+        return None
+    return await run_full_scan(resume_job=job)
 
 
 async def run_single_scan(wine_name: str, region: str = "default",
-                          category: str = "", profit_threshold: float = 15) -> dict:
+                          category: str = "", profit_threshold: float = 15,
+                          refresh: bool = False) -> dict:
     """
-    扫描单款酒（手动搜索用，不受缓存限制）
+    扫描单款酒（手动搜索用，不受扫描跳过缓存限制）
+    新鲜期内的抓取结果（定时扫描或之前的搜索写入）直接复用，refresh=True 强制实时抓取
     """
     wine_config = {
         "name": wine_name,
@@ -245,10 +713,22 @@ async def run_single_scan(wine_name: str, region: str = "default",
         "category": category,
     }
 
-    wine_info = await search_wine_basic(wine_name)
+    cached = None if refresh else get_result(wine_name)
+    if cached:
+        wine_info, data_age = cached
+    else:
+        wine_info, data_age = await search_wine_basic(wine_name, refresh=refresh), 0.0
+        put_result(wine_name, wine_info)
+    # 数据年龄按页面实际抓取时间计算（结果缓存或页面缓存命中时都不是刚抓的）
+    if wine_info.get("fetched_at"):
+        data_age = max(data_age, time.time() - wine_info["fetched_at"])
+    freshness = {
+        "cached": cached is not None or bool(wine_info.get("page_cached")),
+        "data_age_seconds": round(data_age),
+    }
 
     if not wine_info.get("found"):
-        return {"wine_name": wine_name, "found": False, "opportunity": None}
+        return {"wine_name": wine_name, "found": False, "opportunity": None, **freshness}
 
     opp = analyze_opportunity(wine_info, wine_config, profit_threshold)
 
@@ -258,4 +738,5 @@ async def run_single_scan(wine_name: str, region: str = "default",
         "global_lowest": wine_info.get("global_lowest"),
         "hk_avg_price": wine_info.get("hk_avg_price_usd"),
         "opportunity": opp,
+        **freshness,
     }
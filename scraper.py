@@ -8,10 +8,20 @@ import random
 import re
 import os
 import json
+import time
 import logging
-from typing import Optional
-from bs4 import BeautifulSoup
-from exchange_rates import get_cached_rate, to_usd_sync, FALLBACK_RATES as EXCHANGE_RATES
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+from urllib.parse import urlparse
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html_parser import parse_html, BACKEND as PARSER_BACKEND
+import page_cache
+from deadline import Deadline, DeadlineExceeded
+from engine_health import OPEN, EngineRegistry, HedgeBudget
+from http_clients import get_http_client
+from singleflight import SingleFlight, normalize_wine_key
+from exchange_rates import get_cached_rate, get_cached_rates, prime_cached_rates, to_usd_sync, FALLBACK_RATES as EXCHANGE_RATES
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +40,30 @@ USER_AGENTS = [
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
 ]
 
+# 同一目标域名两次请求之间的最小间隔（秒），实际间隔在 [1x, 1.6x] 之间随机抖动
+HOST_MIN_INTERVAL = float(os.getenv("HOST_MIN_INTERVAL", "3"))
+# 同一目标域名同时在途的最大请求数
+HOST_MAX_IN_FLIGHT = int(os.getenv("HOST_MAX_IN_FLIGHT", "2"))
+
+# HTML 解析执行器：auto / process / thread / inline，以及 worker 数
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "auto").lower()
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+
+# 对冲请求：主引擎超过 p90 耗时未返回时并行启动备用引擎（默认关闭）
+FETCH_HEDGING = os.getenv("FETCH_HEDGING", "0") == "1"
+# 每小时最多发起的对冲请求数（对冲可能消耗 ScraperAPI 额度）
+HEDGE_MAX_PER_HOUR = int(os.getenv("HEDGE_MAX_PER_HOUR", "20"))
+# 主引擎尚无耗时样本时的对冲等待秒数
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "20"))
+
+# 全球页面缺 HK 报价的概率达到该阈值时，HK 页面与全球页面并发抓取
+HK_PREFETCH_THRESHOLD = float(os.getenv("HK_PREFETCH_THRESHOLD", "0.5"))
+
+# curl_cffi session 池：池大小、session 最大存活时间、预热 cookie 有效期（秒）
+CURL_POOL_SIZE = int(os.getenv("CURL_POOL_SIZE", "3"))
+CURL_SESSION_MAX_AGE = int(os.getenv("CURL_SESSION_MAX_AGE", str(60 * 60)))
+CURL_WARMUP_TTL = int(os.getenv("CURL_WARMUP_TTL", str(20 * 60)))
+
 # TLS 指纹模拟的浏览器种类（仅使用 curl_cffi 确认支持的）
 IMPERSONATES = [
     "chrome124",
@@ -47,96 +81,281 @@ IMPERSONATES = [
 ]
 
 
-# ── 引擎 1: curl_cffi（主引擎，带 session 预热）──────
-async def _fetch_with_curl_cffi(url: str, max_retries: int = 3) -> Optional[str]:
+# ── 按域名限速（并发扫描时保证对同一站点的请求频率不升高）──
+# 相邻请求间隔 = min_interval × 随机抖动倍数；估算耗时用抖动的均值
+_INTERVAL_JITTER = (1, 1.6)
+_MEAN_INTERVAL_JITTER = sum(_INTERVAL_JITTER) / 2
+
+
+class HostRateLimiter:
     """
-    使用 curl_cffi 模拟真实浏览器 TLS 指纹
-    策略: 先访问主页获取 Cloudflare cookie → 再用同一 session 搜索
+    按目标域名限速器
+    - 同一域名相邻两次请求的发起时间至少间隔 min_interval 秒（带随机抖动）
+    - 同一域名同时在途的请求数不超过 max_in_flight
+    不同酒款的请求可以并发，但对 wine-searcher.com 的整体请求频率不会超过串行扫描时
     """
-    try:
-        from curl_cffi.requests import AsyncSession
-    except ImportError:
-        logger.warning("curl_cffi 未安装，跳过此引擎")
-        return None
 
+    def __init__(self, min_interval: float = HOST_MIN_INTERVAL, max_in_flight: int = HOST_MAX_IN_FLIGHT):
+        self.min_interval = min_interval
+        self.max_in_flight = max(1, max_in_flight)
+        self._next_slot: dict = {}      # host -> 下一次允许发起请求的时间 (monotonic)
+        self._semaphores: dict = {}     # host -> asyncio.Semaphore
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphores[host]
+
+    async def _wait_turn(self, host: str, deadline: Deadline):
+        # 先预订时间槽再睡眠，保证多个协程排队时间隔依然成立
+        now = time.monotonic()
+        start = max(now, self._next_slot.get(host, 0))
+        if start - now >= deadline.remaining():
+            # 排到的时间槽已超出预算，不占用名额
+            raise DeadlineExceeded(f"等待 {host} 限速名额超出预算")
+        self._next_slot[host] = start + self.min_interval * random.uniform(*_INTERVAL_JITTER)
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    @asynccontextmanager
+    async def slot(self, url: str, deadline: Deadline = None):
+        """占用一个请求名额：`async with _host_limiter.slot(url, deadline): ...`"""
+        host = urlparse(url).netloc or url
+        deadline = deadline or Deadline.unbounded()
+        async with self._semaphore(host):
+            await self._wait_turn(host, deadline)
+            yield
+
+
+_host_limiter = HostRateLimiter()
+
+
+# ── curl_cffi 长连接 session 池（复用 Cloudflare cookie 与 TLS 连接）──
+# 预热主页后、发搜索请求前的停顿（秒）
+_WARMUP_PAUSE = (1.5, 4)
+
+
+class _PooledCurlSession:
+    """池中的一个 curl_cffi session：固定指纹 + UA，记录创建/预热时间"""
+
+    def __init__(self, session, impersonate: str, headers: dict):
+        self.session = session
+        self.impersonate = impersonate
+        self.headers = headers
+        self.created_at = time.monotonic()
+        self.warmed_at = 0.0
+        self.uses = 0
+
+    def is_expired(self) -> bool:
+        return time.monotonic() - self.created_at > CURL_SESSION_MAX_AGE
+
+    def is_warm(self) -> bool:
+        return self.warmed_at > 0 and time.monotonic() - self.warmed_at < CURL_WARMUP_TTL
+
+
+class CurlSessionPool:
+    """
+    curl_cffi session 池
+    - 每个 session 长期持有，保留 Cloudflare cookie 和 keep-alive 连接
+    - cookie 仍新鲜时跳过主页预热，省掉一次请求和 1.5-4s 等待
+    - 遇到 403 / 异常 / 超过最大存活时间时丢弃该 session，下次取用时换新指纹重建
+    """
+
+    def __init__(self, size: int = CURL_POOL_SIZE):
+        self.size = max(1, size)
+        self._slots: Optional[asyncio.Queue] = None
+        # 后台关闭中的 session（持有引用防止任务被回收，应用退出时等待关闭完成）
+        self._closing: set = set()
+        self.stats = {"created": 0, "rotated": 0, "warmups": 0, "warmups_skipped": 0}
+
+    def warmup_rate(self) -> float:
+        """平均每次抓取需要的主页预热次数（拉普拉斯平滑，供耗时估算）"""
+        warmups, skipped = self.stats["warmups"], self.stats["warmups_skipped"]
+        return (warmups + 1) / (warmups + skipped + 2)
+
+    def _queue(self) -> asyncio.Queue:
+        # LIFO：优先复用刚归还的（已预热）session，空槽位排在最后
+        if self._slots is None:
+            self._slots = asyncio.LifoQueue()
+            for _ in range(self.size):
+                self._slots.put_nowait(None)  # 空槽位，取用时惰性创建
+        return self._slots
+
+    def _new_session(self) -> Optional[_PooledCurlSession]:
+        try:
+            from curl_cffi.requests import AsyncSession
+        except ImportError:
+            logger.warning("curl_cffi 未安装，跳过此引擎")
+            return None
+
+        impersonate = random.choice(IMPERSONATES)
+        headers = {
+            "User-Agent": random.choice(USER_AGENTS),
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.9",
+            "Accept-Encoding": "gzip, deflate, br",
+            "Connection": "keep-alive",
+            "Upgrade-Insecure-Requests": "1",
+            "Sec-Ch-Ua": '"Chromium";v="124", "Google Chrome";v="124", "Not-A.Brand";v="99"',
+            "Sec-Ch-Ua-Mobile": "?0",
+            "Sec-Ch-Ua-Platform": '"macOS"',
+            "Sec-Fetch-Dest": "document",
+            "Sec-Fetch-Mode": "navigate",
+            "Sec-Fetch-Site": "none",
+            "Sec-Fetch-User": "?1",
+            "Cache-Control": "max-age=0",
+        }
+        self.stats["created"] += 1
+        return _PooledCurlSession(AsyncSession(impersonate=impersonate), impersonate, headers)
+
+    async def acquire(self) -> Optional[_PooledCurlSession]:
+        """取一个可用 session（池满时等待其他请求归还）"""
+        pooled = await self._queue().get()
+        if pooled is not None and pooled.is_expired():
+            await self._close(pooled)
+            self.stats["rotated"] += 1
+            pooled = None
+        if pooled is None:
+            pooled = self._new_session()
+            if pooled is None:
+                self._queue().put_nowait(None)
+        return pooled
+
+    def release(self, pooled: _PooledCurlSession, discard: bool = False):
+        """归还 session；discard=True 时关闭并留出空槽位，下次重建"""
+        if discard:
+            self.stats["rotated"] += 1
+            task = asyncio.ensure_future(self._close(pooled))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+            self._queue().put_nowait(None)
+        else:
+            self._queue().put_nowait(pooled)
+
+    async def _close(self, pooled: _PooledCurlSession):
+        try:
+            await pooled.session.close()
+        except Exception as e:
+            logger.debug(f"关闭 curl_cffi session 失败: {e}")
+
+    async def close(self):
+        """关闭池中所有空闲 session，并等待后台关闭中的 session（应用退出时调用）"""
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        if self._slots is None:
+            return
+        while not self._slots.empty():
+            pooled = self._slots.get_nowait()
+            if pooled is not None:
+                await self._close(pooled)
+        self._slots = None
+
+
+_curl_pool = CurlSessionPool()
+
+
+async def close_curl_sessions():
+    """关闭 curl_cffi session 池"""
+    await _curl_pool.close()
+
+
+# ── 引擎 1: curl_cffi（主引擎，复用池中已预热的 session）──────
+async def _fetch_with_curl_cffi(url: str, max_retries: int = 3, deadline: Deadline = None) -> Optional[str]:
+    """
+    使用 curl_cffi 模拟真实浏览器 TLS 指纹
+    策略: session 未预热时先访问主页获取 Cloudflare cookie → 再用同一 session 搜索
+    已预热的 session 直接发搜索请求
+    """
+    deadline = deadline or Deadline.unbounded()
     for attempt in range(max_retries):
+        pooled = await _curl_pool.acquire()
+        if pooled is None:
+            return None
+
+        discard = False
         try:
-            impersonate = random.choice(IMPERSONATES)
-            ua = random.choice(USER_AGENTS)
-            headers = {
-                "User-Agent": ua,
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
-                "Accept-Language": "en-US,en;q=0.9",
-                "Accept-Encoding": "gzip, deflate, br",
-                "Connection": "keep-alive",
-                "Upgrade-Insecure-Requests": "1",
-                "Sec-Ch-Ua": '"Chromium";v="124", "Google Chrome";v="124", "Not-A.Brand";v="99"',
-                "Sec-Ch-Ua-Mobile": "?0",
-                "Sec-Ch-Ua-Platform": '"macOS"',
-                "Sec-Fetch-Dest": "document",
-                "Sec-Fetch-Mode": "navigate",
-                "Sec-Fetch-Site": "none",
-                "Sec-Fetch-User": "?1",
-                "Cache-Control": "max-age=0",
-            }
-
-            async with AsyncSession(impersonate=impersonate) as session:
-                # Step 1: 预热 — 先访问主页拿 cookie（模拟真人先打开网站首页）
-                warmup_headers = dict(headers)
+            session = pooled.session
+            impersonate = pooled.impersonate
+
+            # Step 1: 预热 — 先访问主页拿 cookie（模拟真人先打开网站首页）
+            if pooled.is_warm():
+                _curl_pool.stats["warmups_skipped"] += 1
+            else:
                 try:
-                    warmup = await session.get(
-                        BASE_URL,
-                        headers=warmup_headers,
-                        timeout=20,
-                        allow_redirects=True,
-                    )
+                    async with _host_limiter.slot(BASE_URL, deadline):
+                        warmup = await session.get(
+                            BASE_URL,
+                            headers=dict(pooled.headers),
+                            timeout=deadline.timeout(20),
+                            allow_redirects=True,
+                        )
+                    _curl_pool.stats["warmups"] += 1
                     logger.debug(f"预热状态: {warmup.status_code} ({impersonate})")
-                    await asyncio.sleep(random.uniform(1.5, 4))
+                    if warmup.status_code == 200:
+                        pooled.warmed_at = time.monotonic()
+                    await deadline.sleep(random.uniform(*_WARMUP_PAUSE))
+                except DeadlineExceeded:
+                    raise
                 except Exception as e:
                     logger.debug(f"预热失败 (继续尝试): {e}")
 
-                # Step 2: 真正的搜索请求，带上 Referer 模拟站内浏览
-                search_headers = dict(headers)
-                search_headers["Referer"] = BASE_URL + "/"
-                search_headers["Sec-Fetch-Site"] = "same-origin"
+            # Step 2: 真正的搜索请求，带上 Referer 模拟站内浏览
+            search_headers = dict(pooled.headers)
+            search_headers["Referer"] = BASE_URL + "/"
+            search_headers["Sec-Fetch-Site"] = "same-origin"
 
+            async with _host_limiter.slot(url, deadline):
                 resp = await session.get(
                     url,
                     headers=search_headers,
-                    timeout=30,
+                    timeout=deadline.timeout(30),
                     allow_redirects=True,
                 )
+            pooled.uses += 1
 
-                if resp.status_code == 200:
-                    logger.info(f"✅ curl_cffi 成功 ({impersonate}): {url[:80]}")
-                    return resp.text
-                elif resp.status_code == 403:
-                    logger.warning(f"curl_cffi 403 (尝试 {attempt+1}/{max_retries}, {impersonate}): {url[:80]}")
-                    await asyncio.sleep(random.uniform(5, 12))
-                    continue
-                else:
-                    logger.warning(f"curl_cffi {resp.status_code}: {url[:80]}")
-                    return None
-
+            if resp.status_code == 200:
+                # 成功请求说明 cookie 仍有效，顺延预热有效期
+                pooled.warmed_at = time.monotonic()
+                logger.info(f"✅ curl_cffi 成功 ({impersonate}): {url[:80]}")
+                return resp.text
+            elif resp.status_code == 403:
+                # 被拦截的 session（cookie/指纹已被标记）直接丢弃，换新 session 重试
+                discard = True
+                logger.warning(f"curl_cffi 403 (尝试 {attempt+1}/{max_retries}, {impersonate}): {url[:80]}")
+                if attempt + 1 < max_retries:
+                    await deadline.sleep(random.uniform(5, 12))
+                continue
+            else:
+                logger.warning(f"curl_cffi {resp.status_code}: {url[:80]}")
+                return None
+
+        except (asyncio.CancelledError, DeadlineExceeded):
+            # 被取消（如对冲落败）或超出预算时连接状态未知，不放回池中复用
+            discard = True
+            raise
         except Exception as e:
+            discard = True
             logger.warning(f"curl_cffi 异常 (尝试 {attempt+1}): {e}")
-            await asyncio.sleep(random.uniform(3, 6))
+            if attempt + 1 < max_retries:
+                await deadline.sleep(random.uniform(3, 6))
             continue
+        finally:
+            _curl_pool.release(pooled, discard=discard)
 
     return None
 
 
 # ── 引擎 2: ScraperAPI（备用，仅 curl_cffi 失败时使用）────
-async def _fetch_with_scraper_api(url: str) -> Optional[str]:
+async def _fetch_with_scraper_api(url: str, deadline: Deadline = None) -> Optional[str]:
     """
     使用 ScraperAPI 免费层（5000 次/月）
     通过代理 IP 绕过 Wine-Searcher 的 IP 封杀
     """
+    deadline = deadline or Deadline.unbounded()
     if not SCRAPER_API_KEY:
         logger.debug("未配置 SCRAPER_API_KEY，跳过 ScraperAPI")
         return None
 
-    import httpx
     api_url = "https://api.scraperapi.com"
     params = {
         "api_key": SCRAPER_API_KEY,
@@ -146,31 +365,36 @@ async def _fetch_with_scraper_api(url: str) -> Optional[str]:
 
     for attempt in range(2):  # 最多重试 2 次
         try:
-            async with httpx.AsyncClient(timeout=90) as client:
-                resp = await client.get(api_url, params=params)
-                if resp.status_code == 200:
-                    logger.info(f"✅ ScraperAPI 成功: {url[:80]}")
-                    return resp.text
-                elif resp.status_code in (500, 502, 503):
-                    logger.warning(f"ScraperAPI {resp.status_code} 重试 ({attempt+1}/2): {url[:80]}")
-                    await asyncio.sleep(random.uniform(3, 6))
-                    continue
-                else:
-                    logger.warning(f"ScraperAPI {resp.status_code}: {url[:80]}")
-                    return None
+            client = get_http_client("scraperapi")
+            async with _host_limiter.slot(url, deadline):
+                resp = await client.get(api_url, params=params, timeout=deadline.timeout(90))
+            if resp.status_code == 200:
+                logger.info(f"✅ ScraperAPI 成功: {url[:80]}")
+                return resp.text
+            elif resp.status_code in (500, 502, 503):
+                logger.warning(f"ScraperAPI {resp.status_code} 重试 ({attempt+1}/2): {url[:80]}")
+                if attempt == 0:
+                    await deadline.sleep(random.uniform(3, 6))
+                continue
+            else:
+                logger.warning(f"ScraperAPI {resp.status_code}: {url[:80]}")
+                return None
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.warning(f"ScraperAPI 异常 ({attempt+1}/2): {e}")
-            await asyncio.sleep(random.uniform(2, 4))
+            if attempt == 0:
+                await deadline.sleep(random.uniform(2, 4))
             continue
 
     return None
 
 
 # ── 引擎 3: httpx 基础请求（最后备用）────────────
-async def _fetch_with_httpx(url: str) -> Optional[str]:
+async def _fetch_with_httpx(url: str, deadline: Deadline = None) -> Optional[str]:
     """最基础的 httpx 请求"""
+    deadline = deadline or Deadline.unbounded()
     try:
-        import httpx
         headers = {
             "User-Agent": random.choice(USER_AGENTS),
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
@@ -178,49 +402,222 @@ async def _fetch_with_httpx(url: str) -> Optional[str]:
             "Accept-Encoding": "gzip, deflate, br",
             "Connection": "keep-alive",
         }
-        async with httpx.AsyncClient(follow_redirects=True, timeout=30) as client:
-            resp = await client.get(url, headers=headers)
-            if resp.status_code == 200:
-                logger.info(f"✅ httpx 成功: {url[:80]}")
-                return resp.text
-            logger.warning(f"httpx {resp.status_code}: {url[:80]}")
-            return None
+        client = get_http_client("wine-searcher")
+        async with _host_limiter.slot(url, deadline):
+            resp = await client.get(url, headers=headers, timeout=deadline.timeout(30))
+        if resp.status_code == 200:
+            logger.info(f"✅ httpx 成功: {url[:80]}")
+            return resp.text
+        logger.warning(f"httpx {resp.status_code}: {url[:80]}")
+        return None
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.warning(f"httpx 异常: {e}")
         return None
 
 
-# ── 统一请求函数（瀑布式降级 — curl_cffi 优先省 API 额度）──
-async def _smart_fetch(url: str) -> Optional[str]:
+# ── 统一请求函数（按引擎健康度动态排序 + 熔断）──
+# 权重体现成本偏好：curl_cffi 免费优先，ScraperAPI 消耗付费额度，httpx 成功率低仅兜底
+_engines = EngineRegistry()
+_engines.register("curl_cffi", weight=1.0)
+_engines.register("scraperapi", weight=0.6)
+_engines.register("httpx", weight=0.5)
+
+
+def _engine_fetchers() -> dict:
+    """当前可用的引擎（未配置 key 的 ScraperAPI 不参与排序，也不计入失败）"""
+    fetchers = {"curl_cffi": lambda url, deadline: _fetch_with_curl_cffi(url, max_retries=2, deadline=deadline)}
+    if SCRAPER_API_KEY:
+        fetchers["scraperapi"] = _fetch_with_scraper_api
+    fetchers["httpx"] = _fetch_with_httpx
+    return fetchers
+
+
+_hedge_budget = HedgeBudget(HEDGE_MAX_PER_HOUR)
+
+
+def get_engine_health() -> dict:
+    """各抓取引擎的健康状态与对冲统计（供 API 展示）"""
+    return {
+        "engines": _engines.snapshot(),
+        "hedging": {"enabled": FETCH_HEDGING, **_hedge_budget.snapshot()},
+    }
+
+
+# 尚无耗时样本时假设的单次请求耗时（秒）
+_DEFAULT_REQUEST_SECONDS = 15.0
+
+
+def _primary_engine() -> Optional[str]:
+    """当前排在最前、熔断未打开的引擎"""
+    for name in _engines.ordered(list(_engine_fetchers())):
+        if _engines.get(name).state != OPEN:
+            return name
+    return None
+
+
+def _warmups_per_page() -> float:
+    """每个页面平均附带的主页预热请求数（只有 curl_cffi 引擎需要预热）"""
+    return _curl_pool.warmup_rate() if _primary_engine() == "curl_cffi" else 0.0
+
+
+def get_fetch_cost_model() -> dict:
     """
-    依次尝试三个引擎，直到成功：
-    1. curl_cffi（免费无限次，TLS 指纹伪装）← 优先
-    2. ScraperAPI（付费额度，仅 curl_cffi 失败时使用）
-    3. httpx（基础请求，兜底）
+    估算扫描耗时所需的参数（供限时扫描挑选酒款），按单个请求计（请求数含预热请求，见 estimate_requests）：
+      - request_seconds: 首选引擎的耗时 EWMA 按页面统计，已包含预热请求与预热后的停顿，按每页请求数摊开；
+        还没有样本时用默认值，另加摊到每个请求上的预热停顿
+      - min_interval: 同域名相邻请求的平均间隔（最小间隔 × 随机抖动均值）
+      - max_in_flight: 同域名最大在途请求数
     """
-    # 引擎 1: curl_cffi（免费，优先使用）
-    html = await _fetch_with_curl_cffi(url, max_retries=2)
-    if html:
-        return html
+    primary = _primary_engine()
+    page_seconds = _engines.get(primary).latency_ewma if primary else None
+    warmups = _warmups_per_page()
+    if page_seconds:
+        request_seconds = page_seconds / (1 + warmups)
+    else:
+        request_seconds = _DEFAULT_REQUEST_SECONDS + warmups * sum(_WARMUP_PAUSE) / 2 / (1 + warmups)
+    return {
+        "request_seconds": request_seconds,
+        "min_interval": _host_limiter.min_interval * _MEAN_INTERVAL_JITTER,
+        "max_in_flight": _host_limiter.max_in_flight,
+        "warmups_per_page": round(warmups, 3),
+    }
+
+
+# 请求超时被截短到剩余预算时，引擎自身的超时会在预算耗尽的同一时刻触发；留出计时误差
+_BUDGET_SLACK_SECONDS = 0.05
 
-    # 引擎 2: ScraperAPI（仅 curl_cffi 失败时使用，节省额度）
-    html = await _fetch_with_scraper_api(url)
-    if html:
-        return html
 
-    # 引擎 3: httpx（兜底）
-    html = await _fetch_with_httpx(url)
+def _budget_exhausted(deadline: Deadline) -> bool:
+    return deadline.budget is not None and deadline.remaining() <= _BUDGET_SLACK_SECONDS
+
+
+async def _try_engine(name: str, fetcher, url: str, deadline: Deadline) -> Optional[str]:
+    """
+    调用单个引擎并记录耗时与成败
+    超出预算不算引擎失败：引擎因截短后的超时报错（或吞掉超时返回空）时，统一改抛 DeadlineExceeded
+    """
+    health = _engines.get(name)
+    started = time.monotonic()
+    try:
+        html = await fetcher(url, deadline)
+    except (asyncio.CancelledError, DeadlineExceeded):
+        health.cancel_probe()
+        raise
+    except Exception as e:
+        if _budget_exhausted(deadline):
+            health.cancel_probe()
+            raise DeadlineExceeded(f"超出 {deadline.budget:.0f}s 预算 ({name}: {e})") from e
+        health.record_failure(time.monotonic() - started, str(e))
+        logger.warning(f"引擎 {name} 异常: {e}")
+        return None
     if html:
-        return html
+        health.record_success(time.monotonic() - started)
+    elif _budget_exhausted(deadline):
+        health.cancel_probe()
+        raise DeadlineExceeded(f"超出 {deadline.budget:.0f}s 预算 ({name})")
+    else:
+        health.record_failure(time.monotonic() - started, "empty_or_blocked")
+    return html
+
+
+async def _hedged_fetch(name: str, primary: asyncio.Task, remaining: list,
+                        fetchers: dict, url: str, deadline: Deadline) -> Optional[str]:
+    """
+    对冲请求：主引擎超过其 p90 耗时仍未返回时，并行启动下一个引擎
+    先拿到有效页面的一方胜出，另一方立即取消；对冲次数受每小时额度限制
+    """
+    delay = _engines.get(name).latency_percentile(0.9) or HEDGE_DEFAULT_DELAY
+    done, _ = await asyncio.wait({primary}, timeout=min(delay, deadline.remaining()))
+    if done:
+        return primary.result()
+
+    secondary_name = None
+    if _hedge_budget.available():
+        for candidate in remaining:
+            if _engines.get(candidate).allow_request():
+                secondary_name = candidate
+                break
+    else:
+        _hedge_budget.stats["denied"] += 1
+    if secondary_name is None:
+        return await primary
+
+    remaining.remove(secondary_name)
+    _hedge_budget.consume()
+    logger.info(f"⏱️ {name} 超过 p90 ({delay:.1f}s) 未返回，对冲启动 {secondary_name}: {url[:80]}")
+    tasks = {
+        primary: name,
+        asyncio.ensure_future(_try_engine(secondary_name, fetchers[secondary_name], url, deadline)): secondary_name,
+    }
+    try:
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                winner = tasks.pop(task)
+                html = task.result()
+                if html:
+                    if winner == secondary_name:
+                        _hedge_budget.stats["won"] += 1
+                    return html
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _smart_fetch(url: str, deadline: Deadline = None) -> Optional[str]:
+    """
+    按健康度依次尝试各引擎，直到成功：
+    - 默认顺序 curl_cffi（免费）→ ScraperAPI（付费额度）→ httpx（兜底）
+    - 成功率/耗时变化后动态调整顺序；熔断中的引擎直接跳过，冷却后再探测
+    - FETCH_HEDGING=1 时主引擎慢于 p90 会并行启动下一个引擎（对冲请求）
+    - deadline 预算耗尽时抛出 DeadlineExceeded
+    """
+    deadline = deadline or Deadline.unbounded()
+    fetchers = _engine_fetchers()
+    remaining = _engines.ordered(list(fetchers))
+    while remaining:
+        deadline.check()
+        name = remaining.pop(0)
+        if not _engines.get(name).allow_request():
+            logger.debug(f"引擎 {name} 熔断中，跳过")
+            continue
+        primary = asyncio.ensure_future(_try_engine(name, fetchers[name], url, deadline))
+        if FETCH_HEDGING and remaining:
+            try:
+                html = await _hedged_fetch(name, primary, remaining, fetchers, url, deadline)
+            finally:
+                if not primary.done():
+                    primary.cancel()
+        else:
+            html = await primary
+        if html:
+            return html
 
     logger.error(f"❌ 所有引擎均失败: {url[:80]}")
     return None
 
 
-# ── 随机延迟 ─────────────────────────────
-async def _random_delay(min_sec: float = 3, max_sec: float = 8):
-    """模拟人类浏览间隔"""
-    await asyncio.sleep(random.uniform(min_sec, max_sec))
+# ── 带页面缓存的请求（新鲜期内直接读盘，不发网络请求）──
+async def _cached_fetch(url: str, deadline: Deadline = None, refresh: bool = False,
+                        on_miss: Optional[Callable[[], None]] = None) -> Optional[str]:
+    """
+    refresh=True 时跳过页面缓存，强制实时抓取（结果照常写入缓存）
+    on_miss: 确定要走网络请求时、发出请求前调用（缓存命中时不调用）
+    """
+    html = None if refresh else await page_cache.get_page(url)
+    if html:
+        logger.info(f"📦 页面缓存命中: {url[:80]}")
+        return html
+
+    if on_miss is not None:
+        on_miss()
+    html = await _smart_fetch(url, deadline)
+    if html:
+        await page_cache.put_page(url, html)
+    return html
 
 
 # ── 价格解析 ─────────────────────────────
@@ -304,34 +701,190 @@ def _to_usd(price: float, currency: str) -> float:
     return to_usd_sync(price, currency)
 
 
+# ── 解析执行器（HTML 解析是 CPU 密集任务，不在事件循环里跑）──
+def _default_parse_executor_kind() -> str:
+    # selectolax / lxml 解析时释放 GIL，线程池即可并行；纯 Python 的 bs4 需要进程池
+    if PARSE_EXECUTOR != "auto":
+        return PARSE_EXECUTOR
+    return "thread" if PARSER_BACKEND in ("selectolax", "lxml") else "process"
+
+
+_parse_executor_kind = _default_parse_executor_kind()
+_parse_executor: Optional[Executor] = None
+
+
+def _get_parse_executor() -> Optional[Executor]:
+    """惰性创建解析执行器；PARSE_EXECUTOR=inline 时返回 None（直接在事件循环中解析）"""
+    global _parse_executor
+    if _parse_executor_kind == "inline":
+        return None
+    if _parse_executor is None:
+        if _parse_executor_kind == "process":
+            _parse_executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+        else:
+            _parse_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="parse")
+        logger.info(f"HTML 解析执行器: {_parse_executor_kind} x{PARSE_WORKERS} (后端 {PARSER_BACKEND})")
+    return _parse_executor
+
+
+def _shutdown_parse_executor():
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
+        _parse_executor = None
+
+
+def shutdown_parse_executor():
+    """关闭解析执行器（应用退出时调用）"""
+    _shutdown_parse_executor()
+
+
 # ── 页面解析 ─────────────────────────────
-def _parse_wine_page(html: str) -> list:
-    """解析 Wine-Searcher 搜索结果页"""
-    results = []
-    soup = BeautifulSoup(html, 'html.parser')
-
-    # 方法1: 优先尝试多种 CSS 选择器（Wine-Searcher 页面结构可能变化）
-    selectors = [
-        '.card__offer', '.offer-row', '.result-row', '[data-offer]',
-        'tr.offer', '.search-result-item',
-        '.wine-card', '.listing-row', '.price-listing',
-        'div[class*="offer"]', 'div[class*="listing"]',
-        'tr[class*="offer"]', 'tr[class*="result"]',
-    ]
-    offer_cards = []
-    for sel in selectors:
-        offer_cards = soup.select(sel)
+# offer 卡片 CSS 选择器（Wine-Searcher 页面结构可能变化，按默认顺序兜底）
+OFFER_SELECTORS = [
+    '.card__offer', '.offer-row', '.result-row', '[data-offer]',
+    'tr.offer', '.search-result-item',
+    '.wine-card', '.listing-row', '.price-listing',
+    'div[class*="offer"]', 'div[class*="listing"]',
+    'tr[class*="offer"]', 'tr[class*="result"]',
+]
+
+# 连续多少页所有选择器都未命中时告警（页面结构可能已改版）
+_LAYOUT_ALERT_STREAK = 3
+
+
+class SelectorStats:
+    """
+    选择器命中学习
+    - 记住全局和每个页面（按 URL 区分：同一款酒的全球页和按国家过滤的页面结构可能不同）
+      上次命中的选择器，下次优先尝试，未命中再按默认顺序回退
+    - 统计命中率；学到的选择器失效或连续全部未命中时提前告警（页面改版信号）
+    """
+
+    def __init__(self, selectors: list):
+        self.selectors = list(selectors)
+        self.last_hit: Optional[str] = None
+        self.last_hit_by_page: dict = {}
+        self.hits = {sel: 0 for sel in self.selectors}
+        self.pages = 0
+        self.first_try_hits = 0
+        self.queries = 0
+        self.full_misses = 0
+        self.full_miss_streak = 0
+
+    def order(self, page_key: str = None) -> list:
+        """本次解析的选择器尝试顺序：该页面上次命中 → 全局上次命中 → 默认顺序"""
+        preferred = [self.last_hit_by_page.get(page_key) if page_key else None, self.last_hit]
+        head = [sel for sel in dict.fromkeys(preferred) if sel]
+        return head + [sel for sel in self.selectors if sel not in head]
+
+    def record(self, page_key: Optional[str], hit: Optional[str], tried: int):
+        self.pages += 1
+        self.queries += tried
+        if hit is None:
+            self.full_misses += 1
+            self.full_miss_streak += 1
+            if self.full_miss_streak == _LAYOUT_ALERT_STREAK:
+                logger.warning(f"⚠️ 连续 {self.full_miss_streak} 页所有 offer 选择器均未命中，Wine-Searcher 页面结构可能已改版")
+            return
+
+        self.full_miss_streak = 0
+        self.hits[hit] = self.hits.get(hit, 0) + 1
+        if tried == 1:
+            self.first_try_hits += 1
+        if page_key:
+            # 同一页面改用了别的选择器，说明该页面结构变了
+            previous = self.last_hit_by_page.get(page_key)
+            if previous and hit != previous:
+                logger.warning(f"⚠️ offer 选择器切换 ({page_key[:80]}): {previous} → {hit}（页面结构可能变化）")
+            self.last_hit_by_page[page_key] = hit
+        self.last_hit = hit
+
+    def snapshot(self) -> dict:
+        return {
+            "pages": self.pages,
+            "first_try_hit_rate": round(self.first_try_hits / self.pages, 3) if self.pages else 0,
+            "avg_queries_per_page": round(self.queries / self.pages, 2) if self.pages else 0,
+            "full_misses": self.full_misses,
+            "full_miss_streak": self.full_miss_streak,
+            "layout_change_suspected": self.full_miss_streak >= _LAYOUT_ALERT_STREAK,
+            "last_hit": self.last_hit,
+            "hits": {sel: n for sel, n in self.hits.items() if n},
+            "pages_learned": len(self.last_hit_by_page),
+        }
+
+
+_selector_stats = SelectorStats(OFFER_SELECTORS)
+
+
+def get_selector_stats() -> dict:
+    """选择器命中统计（供 API 展示）"""
+    return _selector_stats.snapshot()
+
+
+def _find_offer_cards(doc, selectors: list) -> tuple:
+    """按顺序尝试选择器，返回 (命中的卡片列表, 命中的选择器, 尝试次数)"""
+    for tried, sel in enumerate(selectors, 1):
+        offer_cards = doc.select(sel)
         if offer_cards:
-            logger.debug(f"HTML 解析命中选择器: {sel} ({len(offer_cards)} 条)")
-            break
+            logger.debug(f"HTML 解析命中选择器: {sel} ({len(offer_cards)} 条, 第 {tried} 次尝试)")
+            return offer_cards, sel, tried
+    return [], None, len(selectors)
+
+
+def _parse_wine_page(html: str, backend: str = None, page_key: str = None) -> list:
+    """
+    解析 Wine-Searcher 搜索结果页（在当前线程同步执行）
+    :param backend: 解析后端，默认使用 html_parser 自动选择的后端
+    :param page_key: 页面 URL，用于按页面记忆命中的选择器
+    """
+    results, hit, tried = _parse_offers(html, _selector_stats.order(page_key), backend)
+    _selector_stats.record(page_key, hit, tried)
+    return results
+
+
+async def _parse_wine_page_async(html: str, page_key: str = None) -> list:
+    """解析 Wine-Searcher 搜索结果页（派发到解析线程池/进程池，不阻塞事件循环）"""
+    executor = _get_parse_executor()
+    if executor is None:
+        return _parse_wine_page(html, page_key=page_key)
+
+    selectors = _selector_stats.order(page_key)
+    # 子进程没有主进程的实时汇率缓存，随任务一并传过去
+    rates = get_cached_rates() if _parse_executor_kind == "process" else None
+    try:
+        loop = asyncio.get_running_loop()
+        results, hit, tried = await loop.run_in_executor(executor, _parse_offers, html, selectors, None, rates)
+    except BrokenProcessPool as e:
+        logger.warning(f"解析进程池异常，改为当前线程解析: {e}")
+        _shutdown_parse_executor()
+        return _parse_wine_page(html, page_key=page_key)
+
+    _selector_stats.record(page_key, hit, tried)
+    return results
+
+
+def _parse_offers(html: str, selectors: list, backend: str = None, rates: dict = None) -> tuple:
+    """
+    页面解析主体（纯函数，可在子进程中执行）
+    返回 (offer 记录列表, 命中的选择器, 选择器尝试次数)
+    """
+    if rates:
+        prime_cached_rates(rates)
+
+    results = []
+    doc = parse_html(html, backend)
+
+    # 方法1: CSS 选择器（按传入顺序，通常是上次命中的选择器优先）
+    offer_cards, hit, tried = _find_offer_cards(doc, selectors)
 
     for card in offer_cards[:20]:
         try:
             merchant_el = card.select_one('.merchant-name, .offer-merchant, a[data-merchant]')
-            merchant = merchant_el.get_text(strip=True) if merchant_el else "未知商家"
+            merchant = merchant_el.text(strip=True) if merchant_el else "未知商家"
 
             # 🛑 过滤 1: 排除拍卖和整箱
-            card_text = card.get_text().lower()
+            card_text = card.text().lower()
             if any(kw in card_text for kw in ['auction', 'bid ', 'lot of', 'case of', 'set of']):
                 continue
             if 'auction' in merchant.lower():
@@ -340,7 +893,7 @@ def _parse_wine_page(html: str) -> list:
             price_el = card.select_one('.offer-price, .price, [data-price]')
             if not price_el:
                 continue
-            price_text = price_el.get_text(strip=True)
+            price_text = price_el.text(strip=True)
             price = _parse_price(price_text)
             
             # 🛑 过滤 2: 排除价格过低（可能是配件或误报）
@@ -349,14 +902,14 @@ def _parse_wine_page(html: str) -> list:
 
 
             country_el = card.select_one('.country, .offer-country, [data-country]')
-            country = country_el.get_text(strip=True) if country_el else ""
+            country = country_el.text(strip=True) if country_el else ""
 
             currency = _detect_currency(price_text, country)
 
             # 优先获取 wine-searcher.com 的链接（具体 listing），而非酒商主页
             link = ""
             for a_tag in card.select('a[href]'):
-                href = a_tag.get('href', '')
+                href = a_tag.attr('href')
                 if 'wine-searcher.com' in href or href.startswith('/find') or href.startswith('/merchant'):
                     link = href
                     break
@@ -376,9 +929,9 @@ def _parse_wine_page(html: str) -> list:
 
     # 方法2: JSON-LD
     if not results:
-        for script in soup.select('script[type="application/ld+json"]'):
+        for script in doc.select('script[type="application/ld+json"]'):
             try:
-                data = json.loads(script.string)
+                data = json.loads(script.text())
                 if isinstance(data, dict) and 'offers' in data:
                     offers = data['offers']
                     if isinstance(offers, list):
@@ -406,7 +959,7 @@ def _parse_wine_page(html: str) -> list:
     # 方法3: 简单价格提取（fallback）— 严格限制范围
     if not results:
         # 尝试从页面中直接提取价格数字
-        price_patterns = soup.find_all(string=re.compile(r'\$[\d,]+\.?\d*'))
+        price_patterns = doc.strings_matching(re.compile(r'\$[\d,]+\.?\d*'))
         for pt in price_patterns[:5]:
             price = _parse_price(pt)
             # 严格限制：单瓶葡萄酒价格通常在 $20-$15000 之间
@@ -420,24 +973,37 @@ def _parse_wine_page(html: str) -> list:
                     "url": "",
                 })
 
-    return results
+    return results, hit, tried
 
 
 # ── 公开 API ─────────────────────────────
-async def search_wine_prices(wine_name: str, country_filter: str = None) -> list:
-    """搜索酒价"""
+async def search_wine_prices(wine_name: str, country_filter: str = None, deadline: Deadline = None,
+                             refresh: bool = False) -> list:
+    """
+    搜索酒价（deadline 为本次搜索的总耗时预算，超出时抛出 DeadlineExceeded）
+    同一款酒、同一国家过滤的并发搜索合并为一次抓取；refresh=True 跳过页面缓存
+    """
+    return await _price_flights.do(
+        (normalize_wine_key(wine_name, country_filter), refresh),
+        lambda flight_deadline: _search_wine_prices(wine_name, country_filter, flight_deadline, refresh),
+        deadline,
+    )
+
+
+async def _search_wine_prices(wine_name: str, country_filter: Optional[str], deadline: Optional[Deadline],
+                              refresh: bool = False) -> list:
     search_query = wine_name.replace(' ', '+')
     url = f"{BASE_URL}/find/{search_query}/1/a"
     if country_filter:
         url += f"?Xcountry={country_filter}"
 
-    await _random_delay(2, 5)
-    html = await _smart_fetch(url)
+    # 请求间隔由 _host_limiter 按域名统一控制，并发扫描时同样生效
+    html = await _cached_fetch(url, deadline, refresh)
 
     if not html:
         return []
 
-    results = _parse_wine_page(html)
+    results = await _parse_wine_page_async(html, page_key=url)
 
     # 如果是香港页面，强制将未标注 HKD 的 $ 价格视为 HKD
     if country_filter and 'hong' in country_filter.lower():
@@ -460,9 +1026,9 @@ async def get_global_lowest_price(wine_name: str) -> Optional[dict]:
     return results[0]
 
 
-async def get_hk_average_price(wine_name: str) -> Optional[float]:
+async def get_hk_average_price(wine_name: str, deadline: Deadline = None, refresh: bool = False) -> Optional[float]:
     """获取香港市场均价（含异常值过滤）"""
-    results = await search_wine_prices(wine_name, country_filter="hong+kong")
+    results = await search_wine_prices(wine_name, country_filter="hong+kong", deadline=deadline, refresh=refresh)
     if not results:
         return None
 
@@ -482,25 +1048,128 @@ async def get_hk_average_price(wine_name: str) -> Optional[float]:
     return avg
 
 
-async def search_wine_basic(wine_name: str) -> dict:
+# ── 全球页面缺少 HK 报价的预测（决定是否并发抓取 HK 页面）──
+class HkMissPredictor:
+    """
+    按酒统计全球页面缺少香港报价的频率（拉普拉斯平滑）
+    - 经常缺 HK 数据的酒：HK 页面与全球页面并发抓取，省掉一次串行等待
+    - 全球页面稳定带 HK 数据的酒：从不预抓 HK 页面，缺失时才串行补抓
+    """
+
+    def __init__(self, threshold: float = HK_PREFETCH_THRESHOLD):
+        self.threshold = threshold
+        self._pages: dict = {}   # wine_name -> 已观察的全球页面数
+        self._misses: dict = {}  # wine_name -> 其中缺少 HK 报价的次数
+        self.stats = {"prefetched": 0, "prefetch_used": 0, "prefetch_wasted": 0, "sequential_fallbacks": 0}
+
+    def miss_probability(self, wine_name: str) -> float:
+        pages = self._pages.get(wine_name, 0)
+        return (self._misses.get(wine_name, 0) + 1) / (pages + 2)
+
+    def should_prefetch(self, wine_name: str) -> bool:
+        # 至少观察过一次才预测，避免对新酒盲目多发请求
+        return self._pages.get(wine_name, 0) > 0 and self.miss_probability(wine_name) >= self.threshold
+
+    def expected_requests(self, wine_name: str) -> float:
+        """抓取这款酒预计要发的页面请求数（全球页 + 可能的 HK 页）"""
+        return 1 + self.miss_probability(wine_name)
+
+    def record(self, wine_name: str, had_hk: bool):
+        self._pages[wine_name] = self._pages.get(wine_name, 0) + 1
+        if not had_hk:
+            self._misses[wine_name] = self._misses.get(wine_name, 0) + 1
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "threshold": self.threshold,
+            "wines_tracked": len(self._pages),
+            "wines_prefetching": sum(1 for w in self._pages if self.should_prefetch(w)),
+        }
+
+
+_hk_predictor = HkMissPredictor()
+
+
+# ── 并发搜索合并 ──
+_basic_flights = SingleFlight("search_wine_basic")
+_price_flights = SingleFlight("search_wine_prices")
+
+
+def get_singleflight_stats() -> dict:
+    """请求合并统计（供 API 展示）"""
+    return {"basic": _basic_flights.snapshot(), "prices": _price_flights.snapshot()}
+
+
+def estimate_requests(wine_name: str) -> float:
+    """抓取一款酒预计消耗的请求数：页面数（全球页 + 可能的 HK 页）× 每页请求数（含摊销的预热请求）"""
+    return _hk_predictor.expected_requests(wine_name) * (1 + _warmups_per_page())
+
+
+def get_hk_prefetch_stats() -> dict:
+    """HK 页面预抓统计（供 API 展示）"""
+    return _hk_predictor.snapshot()
+
+
+async def search_wine_basic(wine_name: str, deadline: Deadline = None, refresh: bool = False) -> dict:
     """
     搜索一款酒基本信息 — 单请求合并版
-    只发 1 次请求，同时提取全球最低价和香港均价
-    相比旧版（2 次请求）节省 50% API 调用
+    优先从全球页面同时提取全球最低价和香港均价；
+    历史上全球页面经常缺 HK 数据的酒，会并发抓取 HK 页面，避免两次串行请求
+    同一款酒的并发搜索（用户搜索 + 定时扫描）合并为一次抓取
+    deadline: 本款酒的总耗时预算，传递到每个抓取引擎；超出时抛出 DeadlineExceeded
+    refresh: 跳过页面缓存强制实时抓取（只与同样强制刷新的搜索合并）
+    返回值中 fetched_at 为全球页面的抓取时间，page_cached 表示全球页面来自页面缓存
     """
+    return await _basic_flights.do(
+        (normalize_wine_key(wine_name), refresh),
+        lambda flight_deadline: _fetch_wine_basic(wine_name, flight_deadline, refresh),
+        deadline,
+    )
+
+
+async def _fetch_wine_basic(wine_name: str, deadline: Optional[Deadline], refresh: bool) -> dict:
+    # 预抓只在全球页面确实要发网络请求时启动：全球页面命中页面缓存时几乎不耗时，
+    # 这时再并发抓 HK 页面既省不了时间，又可能白白消耗一次请求
+    prefetched = []
+
+    def start_prefetch():
+        if _hk_predictor.should_prefetch(wine_name):
+            _hk_predictor.stats["prefetched"] += 1
+            prefetched.append(asyncio.ensure_future(
+                get_hk_average_price(wine_name, deadline=deadline, refresh=refresh)))
+
+    try:
+        return await _search_wine_basic(wine_name, deadline, refresh, start_prefetch, prefetched)
+    finally:
+        for hk_task in prefetched:
+            if not hk_task.done():
+                hk_task.cancel()
+            elif not hk_task.cancelled():
+                hk_task.exception()  # 已取回结果或异常，避免未处理异常告警
+
+
+async def _search_wine_basic(wine_name: str, deadline: Optional[Deadline], refresh: bool,
+                             on_miss: Callable[[], None], prefetched: list) -> dict:
     search_query = wine_name.replace(' ', '+')
     url = f"{BASE_URL}/find/{search_query}/1/a"
     ws_search_url = url  # 统一直达链接
 
-    await _random_delay(2, 5)
-    html = await _smart_fetch(url)
+    # 请求间隔由 _host_limiter 按域名统一控制，并发扫描时同样生效
+    fetch_started = time.time()
+    html = await _cached_fetch(url, deadline, refresh, on_miss=on_miss)
+    hk_task = prefetched[0] if prefetched else None
 
     if not html:
         return {"wine_name": wine_name, "found": False}
 
-    results = _parse_wine_page(html)
+    # 页面实际抓取时间：缓存命中时早于本次调用
+    fetched_at = page_cache.fetched_at(url) or time.time()
+    page_info = {"fetched_at": fetched_at, "page_cached": fetched_at < fetch_started}
+
+    results = await _parse_wine_page_async(html, page_key=url)
     if not results:
-        return {"wine_name": wine_name, "found": False}
+        return {"wine_name": wine_name, "found": False, **page_info}
 
     # ── 从同一批结果中分离全球最低价和香港报价 ──
 
@@ -534,15 +1203,24 @@ async def search_wine_basic(wine_name: str) -> dict:
             hk_avg = sum(filtered) / len(filtered)
             logger.info(f"📊 单请求提取 HK 均价 ({wine_name}): ${hk_avg:.2f} (样本 {len(filtered)})")
 
-    # 3. 如果全球页面没有 HK 报价，再单独请求 HK 页面（fallback）
+    _hk_predictor.record(wine_name, had_hk=hk_avg is not None)
+
+    # 3. 如果全球页面没有 HK 报价，使用并发预抓的 HK 页面，或再单独请求（fallback）
     if hk_avg is None:
-        logger.debug(f"全球页面无 HK 数据，尝试单独请求: {wine_name}")
-        await _random_delay(3, 6)
-        hk_avg = await get_hk_average_price(wine_name)
+        if hk_task is not None:
+            _hk_predictor.stats["prefetch_used"] += 1
+            hk_avg = await hk_task
+        else:
+            _hk_predictor.stats["sequential_fallbacks"] += 1
+            logger.debug(f"全球页面无 HK 数据，尝试单独请求: {wine_name}")
+            hk_avg = await get_hk_average_price(wine_name, deadline=deadline, refresh=refresh)
+    elif hk_task is not None:
+        _hk_predictor.stats["prefetch_wasted"] += 1
 
     return {
         "wine_name": wine_name,
         "found": True,
         "global_lowest": global_lowest,
         "hk_avg_price_usd": hk_avg,
+        **page_info,
     }
@@ -0,0 +1,95 @@
+"""
+单飞（single-flight）请求合并
+同一时刻对同一款酒的多次搜索（多个用户同时搜索 + 定时扫描）只发一次抓取：
+  - 第一个调用方发起抓取，后续调用方等待同一个进行中的任务并共享结果
+  - 抓取任务用 asyncio.shield 保护，单个调用方取消（如扫描超时）不影响其他调用方
+  - 抓取按所有等待者中最宽松的预算执行（有调用方不限时则不限时），每个调用方只按自己的预算放弃等待：
+    不限时的调用方不会因为别人的预算耗尽而拿到 DeadlineExceeded
+  - 所有调用方都放弃等待时才取消底层抓取
+  - 每个调用方拿到结果的独立深拷贝，避免互相修改
+"""
+import asyncio
+import copy
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from deadline import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_wine_key(wine_name: str, country_filter: Optional[str] = None) -> tuple:
+    """合并键：酒名忽略大小写与多余空白，再加上国家过滤"""
+    return " ".join(wine_name.lower().split()), (country_filter or "").lower()
+
+
+class _Flight:
+    __slots__ = ("task", "deadline", "waiters")
+
+    def __init__(self, task: asyncio.Task, deadline: Deadline):
+        self.task = task
+        self.deadline = deadline
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按 key 合并并发调用"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.stats = {"started": 0, "shared": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[Deadline], Awaitable], deadline: Deadline = None):
+        """
+        执行 fn(flight_deadline)，同 key 已有进行中的调用时直接等待其结果
+        flight_deadline: 共享任务的预算，随新调用方加入放宽到其中最宽松的一个
+        deadline: 本调用方自己的预算；超出时只放弃等待（抛出 DeadlineExceeded），不影响任务本身
+        """
+        retried = False
+        while True:
+            flight = self._flights.get(key)
+            # 已结束、尚未从表中移除的任务不再加入
+            joined = flight is not None and not flight.task.done()
+            if joined:
+                self.stats["shared"] += 1
+                flight.deadline.extend_to(deadline)
+                logger.debug(f"🔗 合并请求 [{self.name}] {key}")
+            else:
+                flight_deadline = deadline.copy() if deadline is not None else Deadline.unbounded()
+                flight = _Flight(asyncio.ensure_future(fn(flight_deadline)), flight_deadline)
+                self._flights[key] = flight
+                self.stats["started"] += 1
+                flight.task.add_done_callback(lambda task, key=key: self._finish(key, task))
+
+            flight.waiters += 1
+            try:
+                if deadline is not None and deadline.budget is not None:
+                    try:
+                        result = await asyncio.wait_for(asyncio.shield(flight.task), deadline.remaining())
+                    except asyncio.TimeoutError:
+                        raise DeadlineExceeded(f"等待合并请求超出 {deadline.budget:.0f}s 预算")
+                else:
+                    result = await asyncio.shield(flight.task)
+            except DeadlineExceeded:
+                # 加入时共享任务已按更紧的预算超时（放宽来不及生效）：本调用方预算还在，按自己的预算重新发起
+                if joined and not retried and (deadline is None or not deadline.expired):
+                    retried = True
+                    continue
+                raise
+            finally:
+                flight.waiters -= 1
+                if flight.waiters == 0 and not flight.task.done():
+                    # 没有调用方在等了，抓取结果也就没人要
+                    flight.task.cancel()
+            return copy.deepcopy(result)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        flight = self._flights.get(key)
+        if flight is not None and flight.task is task:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()  # 异常已通过 shield 交给调用方，这里只标记为已取回
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "in_flight": len(self._flights)}
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded
+from singleflight import SingleFlight
+
+
+async def _fetch(flight_deadline: Deadline, seconds: float = 0.3):
+    """模拟抓取：像各抓取引擎一样按共享任务的预算放弃"""
+    for _ in range(int(seconds / 0.05)):
+        await asyncio.sleep(0.05)
+        flight_deadline.check()
+    return {"found": True}
+
+
+def test_joined_caller_without_deadline_outlives_starter_budget():
+    async def main():
+        flights = SingleFlight("test")
+        scan = asyncio.ensure_future(flights.do("wine", _fetch, Deadline(0.1)))
+        await asyncio.sleep(0)
+        user = asyncio.ensure_future(flights.do("wine", _fetch))
+        with pytest.raises(DeadlineExceeded):
+            await scan
+        assert await user == {"found": True}
+        assert flights.stats == {"started": 1, "shared": 1}
+
+    asyncio.run(main())
+
+
+def test_joined_caller_keeps_its_own_budget():
+    async def main():
+        flights = SingleFlight("test")
+        user = asyncio.ensure_future(flights.do("wine", _fetch))
+        await asyncio.sleep(0)
+        with pytest.raises(DeadlineExceeded):
+            await flights.do("wine", _fetch, Deadline(0.1))
+        assert await user == {"found": True}
+
+    asyncio.run(main())
+
+
+def test_caller_retries_when_joined_flight_already_timed_out():
+    async def main():
+        flights = SingleFlight("test")
+        calls = []
+
+        async def fetch(flight_deadline: Deadline):
+            calls.append(flight_deadline.budget)
+            if len(calls) == 1:
+                raise DeadlineExceeded("超出预算")
+            return {"found": True}
+
+        scan = asyncio.ensure_future(flights.do("wine", fetch, Deadline(5)))
+        await asyncio.sleep(0)
+        user = asyncio.ensure_future(flights.do("wine", fetch))
+        with pytest.raises(DeadlineExceeded):
+            await scan
+        assert await user == {"found": True}
+        assert len(calls) == 2
+
+    asyncio.run(main())
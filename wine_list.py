@@ -96,6 +96,56 @@ EXTENDED_WINES = [
 # 供前端「硬通货清单」页面展示的完整列表
 ALL_WINES = PREMIUM_WINES + EXTENDED_WINES
 
+# 酒名别名 → 清单中的标准酒名（价格历史按「标准名或别名」精确查询，忽略大小写）
+# 只收录无歧义的常用简称；带重音的 Château 写法自动生成
+WINE_ALIASES = {
+    "Lafite": "Chateau Lafite Rothschild",
+    "Lafite Rothschild": "Chateau Lafite Rothschild",
+    "Mouton": "Chateau Mouton Rothschild",
+    "Mouton Rothschild": "Chateau Mouton Rothschild",
+    "Haut-Brion": "Chateau Haut-Brion",
+    "Cheval Blanc": "Chateau Cheval Blanc",
+    "DRC": "Domaine de la Romanee-Conti",
+    "Domaine de la Romanée-Conti": "Domaine de la Romanee-Conti",
+    "Grange": "Penfolds Grange",
+    "Dom Pérignon": "Dom Perignon",
+    "Cristal": "Louis Roederer Cristal",
+    "Monfortino": "Giacomo Conterno Barolo Monfortino",
+    "Krug Grande Cuvée": "Krug Grande Cuvee",
+    "Comte Georges de Vogüé": "Domaine Comte Georges de Vogue",
+    **{"Château" + w["name"][len("Chateau"):]: w["name"] for w in ALL_WINES if w["name"].startswith("Chateau ")},
+}
+
+# ══════════════════════════════════════════
+# 扫描分层 — 每层的最长刷新间隔（小时），超过即到期优先补扫
+# 按顺序匹配：先按酒名/分类匹配旗舰层，其余核心清单、扩展清单各为一层
+# ══════════════════════════════════════════
+SCAN_TIERS = [
+    {
+        "name": "flagship", "label": "旗舰（一级庄 / Petrus / DRC）", "interval_hours": 1,
+        "categories": ["波尔多一级庄"],
+        "wines": ["Petrus", "Domaine de la Romanee-Conti"],
+    },
+    {
+        "name": "premium", "label": "核心清单", "interval_hours": 6,
+        "wines": [w["name"] for w in PREMIUM_WINES],
+    },
+    {
+        "name": "extended", "label": "扩展清单", "interval_hours": 24,
+        "wines": [w["name"] for w in EXTENDED_WINES],
+    },
+]
+
+
+def get_scan_tier(wine_name: str, category: str = None) -> dict:
+    """酒款所属的扫描分层（不在任何清单中的酒归入最后一层）"""
+    if category is None:
+        category = next((w["category"] for w in ALL_WINES if w["name"] == wine_name), "")
+    for tier in SCAN_TIERS:
+        if wine_name in tier.get("wines", []) or category in tier.get("categories", []):
+            return tier
+    return SCAN_TIERS[-1]
+
 # 运费模型（美元/瓶）
 SHIPPING_COSTS = {
     "Bordeaux": {"per_bottle_case": 7, "per_bottle_single": 12},
@@ -0,0 +1,139 @@
+"""
+扫描结果延迟批量写入（write-behind）
+扫描每款酒会产生价格点、机会、扫描缓存、价格统计等多条写入，逐条 commit 每条都要一次 fsync。
+这里先放进内存缓冲，攒够 WRITE_BEHIND_MAX_BATCH 条或最早一条等了 WRITE_BEHIND_FLUSH_MS 毫秒后，
+用 database.write_batch 一个事务写入：
+  - submit() 立即返回 Future，落库后得到写入结果（机会记录为 id）
+  - 整批失败时逐条重试，单条坏数据不拖累同批其他记录
+  - 扫描结束与应用关闭时 flush()，确保缓冲清空
+  - 持久化延迟（入队到提交的耗时）作为指标暴露
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from database import write_batch
+
+logger = logging.getLogger(__name__)
+
+# ── 配置 ──────────────────────────────────
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "50"))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "500"))
+
+
+class WriteBehindQueue:
+    """按条数或等待时间触发的批量写入缓冲"""
+
+    def __init__(self, max_batch: int = WRITE_BEHIND_MAX_BATCH, flush_ms: float = WRITE_BEHIND_FLUSH_MS):
+        self.max_batch = max(1, max_batch)
+        self.flush_ms = flush_ms
+        # (kind, kwargs, future, 入队时间)
+        self._buffer: list = []
+        self._timer: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.stats = {"submitted": 0, "written": 0, "failed": 0, "batches": 0,
+                      "last_lag_ms": 0.0, "max_lag_ms": 0.0}
+
+    def submit(self, kind: str, **kwargs) -> asyncio.Future:
+        """加入缓冲，返回落库后完成的 Future"""
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append((kind, kwargs, future, time.monotonic()))
+        self.stats["submitted"] += 1
+        if len(self._buffer) >= self.max_batch:
+            self._schedule(0)
+        elif self._timer is None:
+            self._schedule(self.flush_ms / 1000)
+        return future
+
+    def _schedule(self, delay: float):
+        if self._timer is not None and delay > 0:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.ensure_future(self._flush_after(delay))
+
+    async def _flush_after(self, delay: float):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"批量写入失败: {e}")
+
+    async def flush(self):
+        """立即写入缓冲中的全部记录"""
+        async with self._flush_lock:
+            while self._buffer:
+                batch, self._buffer = self._buffer[:self.max_batch], self._buffer[self.max_batch:]
+                await self._write(batch)
+
+    async def _write(self, batch: list):
+        records = [(kind, kwargs) for kind, kwargs, _, _ in batch]
+        try:
+            results = await write_batch(records)
+        except Exception as e:
+            logger.warning(f"批量写入 {len(batch)} 条失败，改为逐条写入: {e}")
+            results = []
+            for record in records:
+                try:
+                    results.append((await write_batch([record]))[0])
+                except Exception as err:
+                    results.append(err)
+
+        now = time.monotonic()
+        lag = (now - min(enqueued for _, _, _, enqueued in batch)) * 1000
+        self.stats["batches"] += 1
+        self.stats["last_lag_ms"] = lag
+        self.stats["max_lag_ms"] = max(self.stats["max_lag_ms"], lag)
+        for (kind, kwargs, future, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                self.stats["failed"] += 1
+                logger.error(f"写入失败（已丢弃）: {kind} {kwargs.get('wine_name', '')}: {result}")
+                if not future.done():
+                    future.set_exception(result)
+                    future.exception()  # 没有调用方等待时也不报「未取回的异常」
+            else:
+                self.stats["written"] += 1
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self):
+        """应用关闭：取消定时器并写完缓冲"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+    def snapshot(self) -> dict:
+        oldest = min((enqueued for _, _, _, enqueued in self._buffer), default=None)
+        return {
+            **{k: round(v, 1) if isinstance(v, float) else v for k, v in self.stats.items()},
+            "pending": len(self._buffer),
+            # 当前未落库数据最长已等待多久（进程此刻崩溃会丢失的时间窗口）
+            "pending_lag_ms": round((time.monotonic() - oldest) * 1000, 1) if oldest is not None else 0.0,
+            "max_batch": self.max_batch,
+            "flush_ms": self.flush_ms,
+        }
+
+
+_queue = WriteBehindQueue()
+
+
+def submit_write(kind: str, **kwargs) -> asyncio.Future:
+    return _queue.submit(kind, **kwargs)
+
+
+async def flush_writes():
+    await _queue.flush()
+
+
+async def close_write_behind():
+    await _queue.close()
+
+
+def get_write_behind_stats() -> dict:
+    """批量写入状态（持久化延迟、待写入条数）"""
+    return _queue.snapshot()